@@ -0,0 +1,46 @@
+import argparse
+import json
+from profiling import summarize_trace
+
+# Kattaroq qiymat yaxshi bo'lgan ko'rsatkichlar; qolganlarida kichikroq yaxshi
+HIGHER_IS_BETTER = {"sends_per_sec", "sends", "runs"}
+
+
+# .json - bench.run natijasi; boshqa fayllar - --profile trace fayli (aylantirilganlari bilan birga)
+def load(path):
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    return summarize_trace(path)
+
+
+# Ikki benchmark natijasini solishtirish: python -m bench.compare base.json new.json
+# (yoki ikki profil trace ini: python -m bench.compare base/trace.jsonl new/trace.jsonl)
+def compare(base, new):
+    rows = []
+    for key, old in base.items():
+        value = new.get(key)
+        if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or isinstance(old, bool):
+            continue
+        change = (value - old) / old * 100 if old else 0.0
+        better = change > 0 if key in HIGHER_IS_BETTER else change < 0
+        mark = "" if abs(change) < 1 else ("+" if better else "-")
+        rows.append((key, old, value, change, mark))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ikki benchmark natijasini solishtirish")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    base = load(args.base)
+    new = load(args.new)
+    if "params" in base and "params" in new and base["params"] != new["params"]:
+        print("⚠️ Parametrlar farq qiladi, natijalarni solishtirish noaniq bo'lishi mumkin")
+    for key, old, value, change, mark in compare(base, new):
+        print(f"{key:28} {old:>12} {value:>12} {change:>+8.1f}% {mark}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import asyncio
+import random
+from telethon.errors import FloodWaitError, ChannelPrivateError
+from telethon.tl.types import InputPeerChannel
+from clients import ClientManager
+
+
+# Benchmark uchun soxta obyektlar: tarmoq va bazaga murojaat qilmaydi,
+# kechikish, FloodWait va xatolar ehtimolini sozlash mumkin.
+class FakeConfig:
+    def __init__(self, latency=0.05, jitter=0.02, flood_rate=0.0, flood_seconds=5, failure_rate=0.0,
+                 connect_latency=0.3, db_latency=0.002):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.failure_rate = failure_rate
+        self.connect_latency = connect_latency
+        self.db_latency = db_latency
+
+    async def delay(self, base=None):
+        base = self.latency if base is None else base
+        await asyncio.sleep(max(0.0, base + random.uniform(-self.jitter, self.jitter)))
+
+
+class Counters:
+    def __init__(self):
+        self.sends = 0
+        self.connects = 0
+        self.connected = 0
+        self.max_connected = 0
+        self.uploads = 0
+        self.downloads = 0
+        self.resolves = 0
+        self.bot_messages = 0
+        self.floods = 0
+        self.failures = 0
+
+
+class FakeTelegramClient:
+    def __init__(self, config, counters):
+        self.config = config
+        self.counters = counters
+        self._connected = False
+
+    async def connect(self):
+        await self.config.delay(self.config.connect_latency)
+        if not self._connected:
+            self._connected = True
+            self.counters.connects += 1
+            self.counters.connected += 1
+            self.counters.max_connected = max(self.counters.max_connected, self.counters.connected)
+
+    async def disconnect(self):
+        if self._connected:
+            self._connected = False
+            self.counters.connected -= 1
+
+    def is_connected(self):
+        return self._connected
+
+    async def is_user_authorized(self):
+        return True
+
+    async def get_input_entity(self, peer_id):
+        self.counters.resolves += 1
+        await self.config.delay()
+        return InputPeerChannel(abs(peer_id), peer_id * 7)
+
+    async def upload_file(self, data, file_name=None):
+        self.counters.uploads += 1
+        await self.config.delay()
+        return object()
+
+    async def _send(self):
+        await self.config.delay()
+        roll = random.random()
+        if roll < self.config.flood_rate:
+            self.counters.floods += 1
+            raise FloodWaitError(request=None, capture=self.config.flood_seconds)
+        if roll < self.config.flood_rate + self.config.failure_rate:
+            self.counters.failures += 1
+            raise ChannelPrivateError(request=None)
+        self.counters.sends += 1
+
+    async def send_message(self, entity, text):
+        await self._send()
+
+    async def send_file(self, entity, file, caption=None):
+        await self._send()
+
+
+class FakeClientManager(ClientManager):
+    def __init__(self, config, counters, **kwargs):
+        super().__init__(0, "", **kwargs)
+        self.config = config
+        self.counters = counters
+
+    def create_client(self, session_file):
+        return FakeTelegramClient(self.config, self.counters)
+
+
+class FakeBot:
+    def __init__(self, config, counters):
+        self.config = config
+        self.counters = counters
+
+    async def get_file(self, file_id):
+        await self.config.delay()
+
+        class FileInfo:
+            file_path = f"photos/{file_id}.jpg"
+        return FileInfo
+
+    async def download_file(self, file_path):
+        self.counters.downloads += 1
+        await self.config.delay()
+        return b"\0" * 64 * 1024
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.counters.bot_messages += 1
+        await self.config.delay()
+
+
+# Database ning benchmark ishlatadigan metodlari (xotirada, sozlanadigan kechikish bilan)
+class FakeDatabase:
+    def __init__(self, config):
+        self.config = config
+        self.queries = 0
+        self.deliveries = []
+        self.next_runs = {}
+        self.peers = {}
+
+    async def _query(self):
+        self.queries += 1
+        await asyncio.sleep(self.config.db_latency)
+
+    async def set_next_run(self, message_id, next_run_at):
+        await self._query()
+        self.next_runs[message_id] = next_run_at
+
+    async def insert_deliveries(self, rows):
+        await self._query()
+        self.deliveries.extend(rows)
+
+    async def checkpoint_targets(self, rows):
+        await self._query()
+
+    async def get_cached_peers(self, session_file, min_resolved_at):
+        await self._query()
+        return [(peer_id,) + row for (account, peer_id), row in self.peers.items()
+                if account == session_file and row[3] >= min_resolved_at]
+
+    async def save_cached_peers(self, rows):
+        if rows:
+            await self._query()
+        for account, peer_id, peer_type, entity_id, access_hash, resolved_at in rows:
+            self.peers[(account, peer_id)] = (peer_type, entity_id, access_hash, resolved_at)
+
+    async def delete_cached_peer(self, session_file, peer_id):
+        await self._query()
+        self.peers.pop((session_file, peer_id), None)
@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import time
+from bench.fakes import FakeConfig, Counters, FakeClientManager, FakeBot, FakeDatabase
+from db import Database
+from deliveries import DeliveryLog
+from entities import EntityCache
+from media_cache import MediaCache
+from notify import Notifier
+from profiling import Profiler, summarize_trace, trace_files
+from ratelimit import SendLimiter
+from scheduler import Scheduler
+from sender import Dispatcher, SENT
+
+logger = logging.getLogger(__name__)
+
+
+# K akkaunt x M takroriy xabar x G guruh yuklamasini haqiqiy Scheduler, Dispatcher, SendLimiter,
+# MediaCache, EntityCache va DeliveryLog orqali soxta Telegram/Bot API bilan ishga tushiradi.
+# Misol: python -m bench.run --accounts 50 --messages 4 --groups 20 --duration 60 --output base.json
+def parse_args():
+    parser = argparse.ArgumentParser(description="Yuborish yo'li uchun yuklama testi")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=3, help="har bir akkauntdagi takroriy xabarlar")
+    parser.add_argument("--groups", type=int, default=10, help="har bir xabardagi guruhlar")
+    parser.add_argument("--interval", type=float, default=10, help="xabarlar oralig'i, sekund")
+    parser.add_argument("--duration", type=float, default=30, help="test davomiyligi, sekund")
+    parser.add_argument("--media-ratio", type=float, default=0.3, help="rasmli xabarlar ulushi")
+    parser.add_argument("--latency", type=float, default=0.05, help="Telegram so'rovi kechikishi, sekund")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--connect-latency", type=float, default=0.3)
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="FloodWait ehtimoli")
+    parser.add_argument("--flood-seconds", type=int, default=5)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="guruh xatosi ehtimoli")
+    parser.add_argument("--db", choices=["memory", "mysql"], default="memory",
+                        help="mysql - MYSQL_* muhit o'zgaruvchilaridagi mahalliy baza")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="memory bazasi so'rovi kechikishi")
+    parser.add_argument("--scheduler-workers", type=int, default=16)
+    parser.add_argument("--send-concurrency", type=int, default=32)
+    parser.add_argument("--account-concurrency", type=int, default=2)
+    parser.add_argument("--account-rate", type=float, default=1.0)
+    parser.add_argument("--peer-rate", type=float, default=0.2)
+    parser.add_argument("--max-clients", type=int, default=0)
+    parser.add_argument("--profile", metavar="TRACE", help="span/event loop kechikishi trace fayli; xulosasi natijalarga qo'shiladi")
+    parser.add_argument("--output", help="natijalar yoziladigan JSON fayl")
+    return parser.parse_args()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return 0.0
+
+
+async def make_db(args, config):
+    if args.db == "memory":
+        return FakeDatabase(config)
+    db = Database(os.getenv("MYSQL_HOST"), os.getenv("MYSQL_USER"), os.getenv("MYSQL_PASSWORD"), os.getenv("MYSQL_DB"),
+                  minsize=1, maxsize=int(os.getenv("DB_POOL_MAX", 10)))
+    await db.connect()
+    await db.init_schema()
+    return db
+
+
+async def run(args):
+    config = FakeConfig(latency=args.latency, jitter=args.jitter, flood_rate=args.flood_rate,
+                        flood_seconds=args.flood_seconds, failure_rate=args.failure_rate,
+                        connect_latency=args.connect_latency, db_latency=args.db_latency)
+    counters = Counters()
+    db = await make_db(args, config)
+    bot = FakeBot(config, counters)
+    clients = FakeClientManager(config, counters, max_clients=args.max_clients)
+    limiter = SendLimiter(account_rate=args.account_rate, peer_rate=args.peer_rate)
+    media_cache = MediaCache(bot)
+    entity_cache = EntityCache(db)
+    delivery_log = DeliveryLog(db)
+    latencies = []
+
+    # Jurnal yozuvlaridan yuborish kechikishlari yig'iladi
+    record = delivery_log.record
+
+    async def record_latency(message_id, peer_id, account, status, latency_ms, error=None):
+        if status == SENT:
+            latencies.append(latency_ms)
+        await record(message_id, peer_id, account, status, latency_ms, error)
+    delivery_log.record = record_latency
+
+    notifier = Notifier(bot, window=1)
+
+    async def report_error(user_id, message_id, gid, error):
+        notifier.notify(user_id, message_id, type(error).__name__, f"❌ Kanallarga yuborishda xato: {error}", peer=gid)
+
+    dispatcher = Dispatcher(clients, limiter, media_cache, entity_cache=entity_cache,
+                            global_concurrency=args.send_concurrency, account_concurrency=args.account_concurrency,
+                            on_error=report_error, delivery_log=delivery_log)
+    drifts = []
+    runs = 0
+
+    # main.send_message_to_channels bilan bir xil yo'l (qabul qiluvchilar holati DeliveryLog orqali yoziladi)
+    async def handler(job):
+        nonlocal runs
+        drifts.append((time.time() - job.next_run) * 1000)
+        runs += 1
+        payload = job.payload
+        await dispatcher.broadcast(payload["session_file"], payload["user_id"], payload["phone"],
+                                   payload["group_ids"], payload["message_text"], payload["media_file_id"],
+                                   message_id=job.job_id)
+
+    async def save_next_run(job):
+        await db.set_next_run(job.job_id, job.next_run)
+
+    profiler = None
+    if args.profile:
+        # Oldingi ishga tushirishning trace i natijalarga aralashmasligi uchun
+        for name in trace_files(args.profile):
+            os.remove(name)
+        profiler = Profiler(args.profile)
+        handler = profiler.wrap("job:run_recurring_message", handler)
+        await profiler.start()
+
+    scheduler = Scheduler(handler, workers=args.scheduler_workers, on_reschedule=save_next_run)
+
+    # Ishga tushish vaqtlari interval bo'ylab tekis taqsimlanadi
+    total = args.accounts * args.messages
+    now = time.time()
+    media_every = int(1 / args.media_ratio) if args.media_ratio > 0 else 0
+    for index in range(total):
+        account, slot = divmod(index, args.messages)
+        user_id = 1000 + account
+        phone = f"+99890{account:07d}"
+        group_ids = [-(1000000000000 + account * 10000 + slot * args.groups + g) for g in range(args.groups)]
+        payload = {
+            "session_file": f"sessions/session_{user_id}_{phone}.session",
+            "user_id": user_id,
+            "phone": phone,
+            "group_ids": group_ids,
+            "message_text": f"Benchmark xabari {index}",
+            "media_file_id": f"photo_{index % 5}" if media_every and index % media_every == 0 else None,
+        }
+        scheduler.add(index + 1, args.interval, payload, next_run=now + args.interval * index / total)
+
+    delivery_log.start()
+    started = time.monotonic()
+    janitor = asyncio.create_task(clients.run_janitor())
+    scheduler.start()
+    await asyncio.sleep(args.duration)
+    await scheduler.stop()
+    elapsed = time.monotonic() - started
+    open_clients = len(clients)
+    janitor.cancel()
+    await asyncio.gather(janitor, return_exceptions=True)
+    await notifier.stop()
+    await delivery_log.stop()
+    await clients.close_all()
+    if args.db == "mysql":
+        await db.close()
+    if profiler is not None:
+        await profiler.stop()
+
+    result = {
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "profile")},
+        "elapsed_s": round(elapsed, 3),
+        "runs": runs,
+        "sends": counters.sends,
+        "sends_per_sec": round(counters.sends / elapsed, 2),
+        "send_latency_p50_ms": round(percentile(latencies, 50), 2),
+        "send_latency_p99_ms": round(percentile(latencies, 99), 2),
+        "scheduler_drift_p50_ms": round(percentile(drifts, 50), 2),
+        "scheduler_drift_p99_ms": round(percentile(drifts, 99), 2),
+        "scheduler_drift_max_ms": round(max(drifts, default=0.0), 2),
+        "flood_waits": counters.floods,
+        "failures": counters.failures,
+        "connects": counters.connects,
+        "open_connections": open_clients,
+        "max_open_connections": counters.max_connected,
+        "uploads": counters.uploads,
+        "downloads": counters.downloads,
+        "resolves": counters.resolves,
+        "bot_messages": counters.bot_messages,
+        "db_queries": getattr(db, "queries", None),
+        "deliveries_dropped": delivery_log.dropped,
+        "rss_mb": round(current_rss_mb(), 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if profiler is not None:
+        result.update(summarize_trace(args.profile))
+    return result
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import re
+
+# Import hujjatidagi ustunlar (CSV sarlavhasi yoki JSON obyekt kalitlari):
+# user_id, phone - akkaunt; targets - guruh ID lari (vergul, nuqta-vergul yoki bo'shliq bilan);
+# text - xabar matni; media - rasmning Bot API file_id si (ixtiyoriy); interval - minutda
+FIELDS = ("user_id", "phone", "targets", "text", "media", "interval")
+MAX_ROWS = 5000
+
+_TARGET_SEPARATORS = re.compile(r"[,;\s]+")
+
+
+def _parse_targets(value):
+    if isinstance(value, list):
+        items = value
+    else:
+        items = _TARGET_SEPARATORS.split(str(value or "").strip())
+    targets = list(dict.fromkeys(int(item) for item in items if str(item).strip()))
+    if not targets:
+        raise ValueError("targets bo'sh")
+    return targets
+
+
+def _parse_record(record):
+    if not isinstance(record, dict):
+        raise ValueError("qator obyekt emas")
+    missing = [field for field in ("user_id", "phone", "targets", "interval") if record.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"majburiy maydonlar yo'q: {', '.join(missing)}")
+    text = str(record.get("text") or "")
+    media = str(record.get("media") or "").strip() or None
+    if not text and not media:
+        raise ValueError("text yoki media bo'lishi kerak")
+    interval = int(record["interval"])
+    if interval <= 0:
+        raise ValueError("interval musbat bo'lishi kerak")
+    return {
+        "user_id": int(record["user_id"]),
+        "phone": str(record["phone"]).strip().replace(" ", ""),
+        "targets": _parse_targets(record["targets"]),
+        "text": text,
+        "media": media,
+        "interval": interval,
+    }
+
+
+# Hujjatni qatorlarga ajratish: ([(qator_raqami, qator), ...], [(qator_raqami, xato), ...])
+def parse_document(file_name, data):
+    text = data.decode("utf-8-sig")
+    if file_name.lower().endswith(".json"):
+        records = json.loads(text)
+        if not isinstance(records, list):
+            raise ValueError("JSON hujjat qatorlar ro'yxati bo'lishi kerak")
+    else:
+        try:
+            records = list(csv.DictReader(io.StringIO(text)))
+        except csv.Error as e:
+            raise ValueError(f"CSV xatosi: {e}")
+    if len(records) > MAX_ROWS:
+        raise ValueError(f"Bir hujjatda {MAX_ROWS} tadan ko'p qator bo'lmasligi kerak")
+    rows = []
+    errors = []
+    for number, record in enumerate(records, 1):
+        try:
+            rows.append((number, _parse_record(record)))
+        except (ValueError, TypeError) as e:
+            errors.append((number, str(e)))
+    return rows, errors
+
+
+# Yakuniy hisobot matni (Telegram xabari uzunligi chegarasida)
+def format_report(created, errors, limit=3500):
+    text = f"📥 Import yakunlandi: {created} ta xabar yaratildi, {len(errors)} ta qatorda xato."
+    lines = [f"{number}-qator: {error}" for number, error in sorted(errors)]
+    for index, line in enumerate(lines):
+        if len(text) + len(line) > limit:
+            text += f"\n... va yana {len(lines) - index} ta xato"
+            break
+        text += "\n" + line
+    return text
@@ -0,0 +1,49 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+# Read-through kesh: qiymat bo'lmasa yoki muddati o'tgan bo'lsa loader() dan olinadi.
+# Bir kalit uchun bir vaqtdagi so'rovlar bitta yuklashni kutadi; invalidate() dan oldin
+# boshlangan yuklash natijasi keshga yozilmaydi (eskirgan qiymat qaytib kelmasligi uchun).
+class TTLCache:
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._loading = {}
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, loader):
+        cached = self._values.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            self._values.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader, self._versions.get(key, 0)))
+            self._loading[key] = future
+            future.add_done_callback(lambda done: self._loading.pop(key) if self._loading.get(key) is done else None)
+        return await asyncio.shield(future)
+
+    async def _load(self, key, loader, version):
+        value = await loader()
+        if self._versions.get(key, 0) == version:
+            self._values[key] = (value, time.monotonic())
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                old_key, _ = self._values.popitem(last=False)
+                self._versions.pop(old_key, None)
+        return value
+
+    def invalidate(self, key):
+        self._values.pop(key, None)
+        self._loading.pop(key, None)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def __len__(self):
+        return len(self._values)
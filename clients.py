@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from telethon import TelegramClient
+from metrics import registry
+from state import LockRegistry
+
+logger = logging.getLogger(__name__)
+
+CONNECT_SECONDS = registry.histogram("tg_connect_seconds", "TelegramClient.connect() davomiyligi")
+
+
+class _Entry:
+    __slots__ = ("client", "last_used", "users")
+
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.users = 0
+
+
+# Har bir sessiya fayli uchun doimiy ulangan TelegramClient lar menejeri.
+# Klientlar qayta ishlatiladi, uzoq vaqt ishlatilmaganlari (eng eskisidan boshlab) yopiladi.
+class ClientManager:
+    def __init__(self, api_id, api_hash, idle_ttl=900, max_clients=0, before_connect=None, session_store=None):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.idle_ttl = idle_ttl
+        self.max_clients = max_clients
+        # Yangi ulanishdan oldin chaqiriladigan korutina (masalan, ulanishlar tezligini cheklash uchun)
+        self.before_connect = before_connect
+        # Berilsa sessiyalar .session fayllar o'rniga shu umumiy omborda saqlanadi (session_store.py)
+        self.session_store = session_store
+        self._entries = OrderedDict()
+        # Sessiya bo'yicha locklar (ishlatilmayotganlari o'chiriladi)
+        self._locks = LockRegistry()
+
+    def create_client(self, session):
+        return TelegramClient(session, self.api_id, self.api_hash)
+
+    # Sessiya fayli faqat shu yerda, birinchi kerak bo'lganda ochiladi
+    async def open_client(self, session_file):
+        session = session_file
+        if self.session_store is not None:
+            session = await self.session_store.open(session_file)
+        return self.create_client(session)
+
+    # Ulangan klientni qaytaradi; authorized=True bo'lsa avtorizatsiyasiz akkaunt uchun None
+    async def get(self, session_file, authorized=True):
+        async with self._locks.hold(session_file):
+            entry = self._entries.get(session_file)
+            if entry is None:
+                client = await self.open_client(session_file)
+                if self.before_connect is not None:
+                    await self.before_connect()
+                with CONNECT_SECONDS.time():
+                    await client.connect()
+                entry = _Entry(client)
+                self._entries[session_file] = entry
+                await self._evict_overflow()
+            elif not entry.client.is_connected():
+                logger.info(f"Klient qayta ulanmoqda: {session_file}")
+                with CONNECT_SECONDS.time(reconnect="1"):
+                    await entry.client.connect()
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(session_file)
+            if authorized and not await entry.client.is_user_authorized():
+                return None
+            return entry.client
+
+    # Klientni ishlatish davomida uni bo'sh deb hisoblamaslik uchun
+    @asynccontextmanager
+    async def use(self, session_file, authorized=True):
+        client = await self.get(session_file, authorized)
+        entry = self._entries.get(session_file)
+        if entry is not None:
+            entry.users += 1
+        try:
+            yield client
+        finally:
+            if entry is not None:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+                if self._entries.get(session_file) is entry:
+                    self._entries.move_to_end(session_file)
+
+    # Tashqarida ulangan klientni (masalan, login tugagach) menejerga topshirish
+    async def adopt(self, session_file, client):
+        async with self._locks.hold(session_file):
+            old = self._entries.pop(session_file, None)
+            if old is not None and old.client is not client:
+                await self._disconnect(session_file, old)
+            self._entries[session_file] = _Entry(client)
+            await self._evict_overflow()
+
+    async def discard(self, session_file):
+        entry = self._entries.pop(session_file, None)
+        if entry is not None:
+            await self._disconnect(session_file, entry)
+
+    # Hech kim ishlatmayotgan klientni idle_ttl ni kutmasdan uzish
+    async def release(self, session_file):
+        entry = self._entries.get(session_file)
+        if entry is not None and entry.users == 0:
+            del self._entries[session_file]
+            await self._disconnect(session_file, entry)
+
+    async def _disconnect(self, session_file, entry):
+        try:
+            await entry.client.disconnect()
+        except Exception as e:
+            logger.error(f"Klientni uzishda xato ({session_file}): {e}")
+
+    async def _evict_overflow(self):
+        if not self.max_clients:
+            return
+        # Eng oxirgi (hozirgina ochilgan) klient yopilmaydi
+        for session_file in list(self._entries)[:-1]:
+            if len(self._entries) <= self.max_clients:
+                break
+            entry = self._entries[session_file]
+            if entry.users == 0:
+                del self._entries[session_file]
+                await self._disconnect(session_file, entry)
+
+    # Bo'sh turgan klientlarni yopish (eng eski ishlatilganidan boshlab)
+    async def close_idle(self):
+        now = time.monotonic()
+        for session_file in list(self._entries):
+            entry = self._entries.get(session_file)
+            if entry is None:
+                continue
+            if now - entry.last_used < self.idle_ttl:
+                break
+            if entry.users == 0:
+                del self._entries[session_file]
+                await self._disconnect(session_file, entry)
+                logger.info(f"Bo'sh klient yopildi: {session_file}")
+
+    async def run_janitor(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.close_idle()
+            except Exception as e:
+                logger.error(f"Klientlarni tozalashda xato: {e}")
+
+    async def close_all(self):
+        while self._entries:
+            session_file, entry = self._entries.popitem(last=False)
+            await self._disconnect(session_file, entry)
+
+    def __len__(self):
+        return len(self._entries)
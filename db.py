@@ -0,0 +1,541 @@
+import logging
+import re
+from contextlib import asynccontextmanager
+import aiomysql
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Pool dan ulanish kutish vaqti ham kiradi
+QUERY_SECONDS = registry.histogram("db_query_seconds", "MySQL so'rovlari davomiyligi")
+_QUERY_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+
+
+# So'rov turi va asosiy jadvali, masalan "select messages"
+def _query_name(query):
+    match = _QUERY_TABLE.search(query)
+    verb = query.split(None, 1)[0].lower()
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+# counters jadvalida soni yuritiladigan jadvallar
+COUNTED_TABLES = ("users", "accounts", "messages")
+
+
+# Ma'lumotlar bazasi bilan ishlash qatlami: bitta umumiy pool, har bir so'rov uchun alohida metod
+class Database:
+    def __init__(self, host, user, password, db, minsize=1, maxsize=10):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.db = db
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.pool = None
+
+    async def connect(self):
+        if self.pool is None:
+            self.pool = await aiomysql.create_pool(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                db=self.db,
+                minsize=self.minsize,
+                maxsize=self.maxsize,
+                autocommit=True
+            )
+        return self.pool
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    # Yordamchi metodlar
+    async def execute(self, query, args=None):
+        with QUERY_SECONDS.time(query=_query_name(query)):
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as c:
+                    await c.execute(query, args)
+                    return c.rowcount
+
+    async def insert(self, query, args=None):
+        with QUERY_SECONDS.time(query=_query_name(query)):
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as c:
+                    await c.execute(query, args)
+                    return c.lastrowid
+
+    # Ko'p qatorli INSERT (aiomysql executemany ni bitta so'rovga aylantiradi)
+    async def executemany(self, query, rows):
+        if not rows:
+            return 0
+        with QUERY_SECONDS.time(query=_query_name(query)):
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as c:
+                    await c.executemany(query, rows)
+                    return c.rowcount
+
+    # Bir nechta so'rovni bitta tranzaksiyada bajarish
+    @asynccontextmanager
+    async def transaction(self):
+        with QUERY_SECONDS.time(query="transaction"):
+            async with self.pool.acquire() as conn:
+                await conn.begin()
+                try:
+                    async with conn.cursor() as c:
+                        yield c
+                    await conn.commit()
+                except BaseException:
+                    await conn.rollback()
+                    raise
+
+    async def fetchone(self, query, args=None):
+        with QUERY_SECONDS.time(query=_query_name(query)):
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as c:
+                    await c.execute(query, args)
+                    return await c.fetchone()
+
+    async def fetchall(self, query, args=None):
+        with QUERY_SECONDS.time(query=_query_name(query)):
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as c:
+                    await c.execute(query, args)
+                    return await c.fetchall()
+
+    # Jadvallarni yaratish
+    async def init_schema(self):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as c:
+                await c.execute('''CREATE TABLE IF NOT EXISTS users (
+                                    user_id BIGINT PRIMARY KEY,
+                                    balance INT DEFAULT 0
+                                )''')
+                await c.execute('''CREATE TABLE IF NOT EXISTS accounts (
+                                    user_id BIGINT,
+                                    phone VARCHAR(20),
+                                    session_file VARCHAR(255),
+                                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                                )''')
+                await c.execute('''CREATE TABLE IF NOT EXISTS messages (
+                                    message_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                                    user_id BIGINT,
+                                    phone VARCHAR(20),
+                                    group_ids TEXT,
+                                    message_text TEXT,
+                                    media_file_id VARCHAR(255),
+                                    send_interval INT,
+                                    is_recurring INT DEFAULT 0,
+                                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                                )''')
+                # Keyingi yuborish vaqti (unix sekund), qayta ishga tushganda jadval davom etadi
+                await self._ensure_column(c, "messages", "next_run_at", "BIGINT NULL")
+                # Akkaunt avtorizatsiyadan chiqsa takroriy xabarlar to'xtatiladi (qayta kirganda davom etadi)
+                await self._ensure_column(c, "messages", "paused", "TINYINT DEFAULT 0")
+                # Akkaunt bo'yicha aniqlangan guruh/kanal InputPeer lari keshi
+                await c.execute('''CREATE TABLE IF NOT EXISTS peer_cache (
+                                    session_file VARCHAR(255),
+                                    peer_id BIGINT,
+                                    peer_type VARCHAR(10),
+                                    entity_id BIGINT,
+                                    access_hash BIGINT,
+                                    resolved_at BIGINT,
+                                    PRIMARY KEY (session_file, peer_id)
+                                )''')
+                # Xabar qabul qiluvchilari: har bir guruh alohida qator (avval group_ids TEXT da vergul bilan saqlanardi)
+                await c.execute('''CREATE TABLE IF NOT EXISTS message_targets (
+                                    message_id BIGINT,
+                                    peer_id BIGINT,
+                                    status VARCHAR(16) DEFAULT 'active',
+                                    last_sent_at BIGINT NULL,
+                                    fail_count INT DEFAULT 0,
+                                    PRIMARY KEY (message_id, peer_id),
+                                    KEY idx_message_targets_peer (peer_id),
+                                    FOREIGN KEY (message_id) REFERENCES messages(message_id) ON DELETE CASCADE
+                                )''')
+                # Har bir yuborish natijasi (DeliveryLog orqali to'plab yoziladi)
+                await c.execute('''CREATE TABLE IF NOT EXISTS deliveries (
+                                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                                    message_id BIGINT,
+                                    peer_id BIGINT,
+                                    account VARCHAR(255),
+                                    status VARCHAR(16),
+                                    latency_ms INT,
+                                    error VARCHAR(255) NULL,
+                                    ts BIGINT,
+                                    KEY idx_deliveries_ts_status (ts, status),
+                                    KEY idx_deliveries_message (message_id)
+                                )''')
+                # Suhbat holatlari (SqlStateStore)
+                await c.execute('''CREATE TABLE IF NOT EXISTS user_states (
+                                    user_id BIGINT PRIMARY KEY,
+                                    state TEXT,
+                                    updated_at BIGINT,
+                                    KEY idx_user_states_updated (updated_at)
+                                )''')
+                # Ko'p jarayonli yuboruvchilar: worker lar, akkaunt ijaralari va xabar hodisalari
+                await c.execute('''CREATE TABLE IF NOT EXISTS sender_workers (
+                                    owner VARCHAR(64) PRIMARY KEY,
+                                    heartbeat_at BIGINT
+                                )''')
+                await c.execute('''CREATE TABLE IF NOT EXISTS account_leases (
+                                    session_file VARCHAR(255) PRIMARY KEY,
+                                    owner VARCHAR(64),
+                                    expires_at BIGINT,
+                                    KEY idx_account_leases_owner (owner)
+                                )''')
+                await c.execute('''CREATE TABLE IF NOT EXISTS message_events (
+                                    event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                                    message_id BIGINT,
+                                    event VARCHAR(16),
+                                    created_at BIGINT,
+                                    KEY idx_message_events_created (created_at)
+                                )''')
+                # Telethon sessiyalari uchun umumiy ombor (SESSION_BACKEND=mysql)
+                await c.execute('''CREATE TABLE IF NOT EXISTS tg_sessions (
+                                    session_key VARCHAR(255) PRIMARY KEY,
+                                    dc_id INT,
+                                    server_address VARCHAR(64),
+                                    port INT,
+                                    auth_key VARBINARY(256),
+                                    takeout_id BIGINT NULL,
+                                    updated_at BIGINT
+                                )''')
+                # Statistika uchun yozishlarda yangilanadigan hisoblagichlar (COUNT(*) o'rniga)
+                await c.execute('''CREATE TABLE IF NOT EXISTS counters (
+                                    name VARCHAR(32) PRIMARY KEY,
+                                    value BIGINT
+                                )''')
+                await self._ensure_index(c, "accounts", "idx_accounts_user", "user_id")
+                await self._ensure_index(c, "messages", "idx_messages_user_recurring", "user_id, is_recurring")
+                await self._ensure_index(c, "messages", "idx_messages_recurring", "is_recurring, message_id")
+                await self._ensure_unique_accounts(c)
+                await self._migrate_group_ids(c)
+                await self._seed_counters(c)
+
+    # Ustun mavjud bo'lmasa qo'shish (eski bazalar uchun)
+    async def _ensure_column(self, c, table, column, definition):
+        await c.execute("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s", (table, column))
+        if not (await c.fetchone())[0]:
+            await c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    async def _ensure_index(self, c, table, name, columns, unique=False):
+        await c.execute("SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s", (table, name))
+        if not (await c.fetchone())[0]:
+            await c.execute(f"ALTER TABLE {table} ADD {'UNIQUE ' if unique else ''}INDEX {name} ({columns})")
+
+    # Bitta foydalanuvchida bir raqam ikki marta bo'lmasligi kerak; eski takrorlar bo'lsa kalit qo'shilmaydi
+    async def _ensure_unique_accounts(self, c):
+        await c.execute("SELECT COUNT(*) FROM (SELECT 1 FROM accounts GROUP BY user_id, phone HAVING COUNT(*) > 1) d")
+        if (await c.fetchone())[0]:
+            logger.warning("accounts jadvalida takroriy (user_id, phone) yozuvlar bor, unikal kalit qo'shilmadi")
+            return
+        await self._ensure_index(c, "accounts", "uq_accounts_user_phone", "user_id, phone", unique=True)
+
+    # Hisoblagichlar faqat birinchi marta mavjud ma'lumotlardan to'ldiriladi (keyingi ishga tushishlarda COUNT(*) yo'q)
+    async def _seed_counters(self, c):
+        await c.execute("SELECT name FROM counters")
+        existing = {row[0] for row in await c.fetchall()}
+        for name in COUNTED_TABLES:
+            if name not in existing:
+                await c.execute(f"INSERT IGNORE INTO counters (name, value) SELECT %s, COUNT(*) FROM {name}", (name,))
+
+    # group_ids TEXT dagi eski ma'lumotlarni message_targets ga ko'chirish (qayta ishga tushirish xavfsiz)
+    async def _migrate_group_ids(self, c):
+        await c.execute("SELECT message_id, group_ids FROM messages WHERE group_ids IS NOT NULL AND group_ids <> ''")
+        rows = await c.fetchall()
+        for message_id, group_ids in rows:
+            peer_ids = set()
+            for gid in group_ids.split(","):
+                try:
+                    peer_ids.add(int(gid))
+                except ValueError:
+                    continue
+            if peer_ids:
+                await c.executemany("INSERT IGNORE INTO message_targets (message_id, peer_id) VALUES (%s, %s)",
+                                    [(message_id, peer_id) for peer_id in peer_ids])
+            await c.execute("UPDATE messages SET group_ids = NULL WHERE message_id = %s", (message_id,))
+        if rows:
+            logger.info(f"{len(rows)} ta xabarning group_ids qiymatlari message_targets ga ko'chirildi")
+
+    # Foydalanuvchilar
+    async def add_user(self, user_id):
+        async with self.transaction() as c:
+            await c.execute("INSERT IGNORE INTO users (user_id, balance) VALUES (%s, 0)", (user_id,))
+            if c.rowcount:
+                await self._count(c, "users", 1)
+
+    async def user_exists(self, user_id):
+        row = await self.fetchone("SELECT COUNT(*) FROM users WHERE user_id = %s", (user_id,))
+        return bool(row[0])
+
+    async def get_balance(self, user_id):
+        row = await self.fetchone("SELECT balance FROM users WHERE user_id = %s", (user_id,))
+        return row[0] if row else 0
+
+    async def change_balance(self, user_id, amount):
+        await self.execute("UPDATE users SET balance = balance + %s WHERE user_id = %s", (amount, user_id))
+
+    # Akkauntlar
+    async def get_accounts(self, user_id):
+        rows = await self.fetchall("SELECT phone FROM accounts WHERE user_id = %s", (user_id,))
+        return [row[0] for row in rows]
+
+    async def add_account(self, user_id, phone, session_file):
+        async with self.transaction() as c:
+            await c.execute("INSERT INTO accounts (user_id, phone, session_file) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE session_file = VALUES(session_file)",
+                            (user_id, phone, session_file))
+            # ON DUPLICATE KEY da rowcount: 1 - yangi qator, 2 - yangilandi, 0 - o'zgarmadi
+            if c.rowcount == 1:
+                await self._count(c, "accounts", 1)
+
+    # Xabarlar
+    async def insert_message(self, user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at=None):
+        async with self.transaction() as c:
+            await c.execute(
+                "INSERT INTO messages (user_id, phone, message_text, media_file_id, send_interval, is_recurring, next_run_at) VALUES (%s, %s, %s, %s, %s, 1, %s)",
+                (user_id, phone, message_text, media_file_id, send_interval, next_run_at))
+            message_id = c.lastrowid
+            await c.executemany("INSERT IGNORE INTO message_targets (message_id, peer_id) VALUES (%s, %s)",
+                                [(message_id, peer_id) for peer_id in group_ids])
+            await self._count(c, "messages", 1)
+        return message_id
+
+    # Ko'p xabarni bitta tranzaksiyada yaratish; rows: (user_id, phone, group_ids, text, media, interval, next_run_at).
+    # Ko'p qatorli INSERT da AUTO_INCREMENT ID lar ketma-ket bo'lishi kafolatlanmaydi, shuning uchun
+    # xabarlar alohida, qabul qiluvchilar esa bitta so'rov bilan yoziladi
+    async def insert_messages(self, rows):
+        message_ids = []
+        targets = []
+        async with self.transaction() as c:
+            for user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at in rows:
+                await c.execute(
+                    "INSERT INTO messages (user_id, phone, message_text, media_file_id, send_interval, is_recurring, next_run_at) VALUES (%s, %s, %s, %s, %s, 1, %s)",
+                    (user_id, phone, message_text, media_file_id, send_interval, next_run_at))
+                message_ids.append(c.lastrowid)
+                targets.extend((c.lastrowid, peer_id) for peer_id in group_ids)
+            if targets:
+                await c.executemany("INSERT IGNORE INTO message_targets (message_id, peer_id) VALUES (%s, %s)", targets)
+            if message_ids:
+                await self._count(c, "messages", len(message_ids))
+        return message_ids
+
+    async def set_next_run(self, message_id, next_run_at):
+        await self.execute("UPDATE messages SET next_run_at = %s WHERE message_id = %s", (int(next_run_at), message_id))
+
+    async def delete_message(self, message_id, user_id):
+        async with self.transaction() as c:
+            await c.execute("DELETE FROM messages WHERE message_id = %s AND user_id = %s", (message_id, user_id))
+            deleted = c.rowcount
+            if deleted:
+                await self._count(c, "messages", -deleted)
+        return deleted
+
+    # {message_id: [peer_id, ...]} - faqat faol qabul qiluvchilar
+    async def get_targets(self, message_ids):
+        targets = {message_id: [] for message_id in message_ids}
+        if not message_ids:
+            return targets
+        placeholders = ", ".join(["%s"] * len(message_ids))
+        rows = await self.fetchall(f"SELECT message_id, peer_id FROM message_targets WHERE message_id IN ({placeholders}) AND status = 'active' ORDER BY message_id, peer_id",
+                                   tuple(message_ids))
+        for message_id, peer_id in rows:
+            targets[message_id].append(peer_id)
+        return targets
+
+    # Berilgan guruhga yuboriladigan xabarlar
+    async def get_messages_for_peer(self, peer_id):
+        rows = await self.fetchall("SELECT message_id FROM message_targets WHERE peer_id = %s", (peer_id,))
+        return [row[0] for row in rows]
+
+    # Yuborishlar jurnali yozuvlari bo'yicha qabul qiluvchilar holati: sikl uzilsa ham qaysi guruhlarga
+    # yuborilgani saqlanadi ("sent" / "failed" - sender.SENT / sender.FAILED)
+    async def checkpoint_targets(self, rows):
+        sent = [(ts, message_id, peer_id) for message_id, peer_id, _, status, _, _, ts in rows if message_id is not None and status == "sent"]
+        failed = [(message_id, peer_id) for message_id, peer_id, _, status, _, _, _ in rows if message_id is not None and status == "failed"]
+        if not sent and not failed:
+            return
+        async with self.transaction() as c:
+            if sent:
+                await c.executemany("UPDATE message_targets SET last_sent_at = %s, fail_count = 0 WHERE message_id = %s AND peer_id = %s", sent)
+            if failed:
+                await c.executemany("UPDATE message_targets SET fail_count = fail_count + 1 WHERE message_id = %s AND peer_id = %s", failed)
+
+    # Uzilgan sikldagi hali yuborilmagan faol qabul qiluvchilar
+    async def get_unsent_targets(self, message_id, cycle_started_at):
+        rows = await self.fetchall("SELECT peer_id FROM message_targets WHERE message_id = %s AND status = 'active' "
+                                   "AND (last_sent_at IS NULL OR last_sent_at < %s) ORDER BY peer_id", (message_id, int(cycle_started_at)))
+        return [row[0] for row in rows]
+
+    # Akkauntning takroriy xabarlarini to'xtatish / davom ettirish; o'zgargan message_id lar qaytadi
+    async def pause_account_messages(self, user_id, phone):
+        return await self._set_paused(user_id, phone, 1)
+
+    async def resume_account_messages(self, user_id, phone):
+        return await self._set_paused(user_id, phone, 0)
+
+    async def _set_paused(self, user_id, phone, paused):
+        async with self.transaction() as c:
+            await c.execute("SELECT message_id FROM messages WHERE user_id = %s AND phone = %s AND is_recurring = 1 AND paused <> %s FOR UPDATE",
+                            (user_id, phone, paused))
+            message_ids = [row[0] for row in await c.fetchall()]
+            if message_ids:
+                placeholders = ", ".join(["%s"] * len(message_ids))
+                await c.execute(f"UPDATE messages SET paused = %s WHERE message_id IN ({placeholders})", (paused, *message_ids))
+        return message_ids
+
+    async def get_recurring_messages(self, user_id):
+        rows = await self.fetchall("SELECT message_id, message_text, send_interval FROM messages WHERE user_id = %s AND is_recurring = 1", (user_id,))
+        targets = await self.get_targets([row[0] for row in rows])
+        return [(message_id, targets[message_id], message_text, send_interval) for message_id, message_text, send_interval in rows]
+
+    # Barcha takroriy xabarlarni bo'laklab o'qish (message_id bo'yicha keyset pagination)
+    async def iter_recurring_messages(self, chunk_size=500):
+        last_id = 0
+        while True:
+            rows = await self.fetchall(
+                "SELECT message_id, user_id, phone, message_text, media_file_id, send_interval, next_run_at FROM messages "
+                "WHERE is_recurring = 1 AND paused = 0 AND message_id > %s ORDER BY message_id LIMIT %s", (last_id, chunk_size))
+            for row in await self._with_targets(rows):
+                yield row
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    # Yuborishlar jurnali
+    async def insert_deliveries(self, rows):
+        await self.executemany("INSERT INTO deliveries (message_id, peer_id, account, status, latency_ms, error, ts) VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+
+    # {status: (soni, o'rtacha latency_ms)} - berilgan vaqtdan beri
+    async def get_delivery_stats(self, since):
+        rows = await self.fetchall("SELECT status, COUNT(*), AVG(latency_ms) FROM deliveries WHERE ts >= %s GROUP BY status", (int(since),))
+        return {status: (count, int(avg or 0)) for status, count, avg in rows}
+
+    # Suhbat holatlari
+    async def get_user_state(self, user_id, min_updated_at):
+        row = await self.fetchone("SELECT state FROM user_states WHERE user_id = %s AND updated_at >= %s", (user_id, min_updated_at))
+        return row[0] if row else None
+
+    async def set_user_state(self, user_id, state, updated_at):
+        await self.execute("INSERT INTO user_states (user_id, state, updated_at) VALUES (%s, %s, %s) "
+                           "ON DUPLICATE KEY UPDATE state = VALUES(state), updated_at = VALUES(updated_at)", (user_id, state, updated_at))
+
+    async def delete_user_state(self, user_id):
+        await self.execute("DELETE FROM user_states WHERE user_id = %s", (user_id,))
+
+    async def delete_user_states_before(self, updated_at):
+        await self.execute("DELETE FROM user_states WHERE updated_at < %s", (updated_at,))
+
+    # Telethon sessiyalari (session_store.SqlSessionStore)
+    async def get_tg_session(self, session_key):
+        return await self.fetchone("SELECT dc_id, server_address, port, auth_key, takeout_id FROM tg_sessions WHERE session_key = %s", (session_key,))
+
+    async def save_tg_sessions(self, rows):
+        await self.executemany("INSERT INTO tg_sessions (session_key, dc_id, server_address, port, auth_key, takeout_id, updated_at) "
+                               "VALUES (%s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE dc_id = VALUES(dc_id), "
+                               "server_address = VALUES(server_address), port = VALUES(port), auth_key = VALUES(auth_key), "
+                               "takeout_id = VALUES(takeout_id), updated_at = VALUES(updated_at)", rows)
+
+    async def delete_tg_session(self, session_key):
+        await self.execute("DELETE FROM tg_sessions WHERE session_key = %s", (session_key,))
+
+    # Yuboruvchi worker lar va akkaunt ijaralari
+    async def register_worker(self, owner, now):
+        await self.execute("INSERT INTO sender_workers (owner, heartbeat_at) VALUES (%s, %s) ON DUPLICATE KEY UPDATE heartbeat_at = VALUES(heartbeat_at)",
+                           (owner, now))
+
+    async def unregister_worker(self, owner):
+        await self.execute("DELETE FROM sender_workers WHERE owner = %s", (owner,))
+
+    async def count_live_workers(self, since):
+        row = await self.fetchone("SELECT COUNT(*) FROM sender_workers WHERE heartbeat_at >= %s", (since,))
+        return row[0]
+
+    # Takroriy xabari bor akkauntlarning sessiya fayllari
+    async def get_sender_accounts(self):
+        rows = await self.fetchall("SELECT DISTINCT a.session_file FROM messages m JOIN accounts a ON a.user_id = m.user_id AND a.phone = m.phone "
+                                   "WHERE m.is_recurring = 1 AND m.paused = 0 ORDER BY a.session_file")
+        return [row[0] for row in rows]
+
+    # Ijara bo'sh yoki muddati o'tgan bo'lsa olinadi; olingan bo'lsa True
+    async def claim_lease(self, session_file, owner, expires_at, now):
+        await self.execute(
+            "INSERT INTO account_leases (session_file, owner, expires_at) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE owner = IF(expires_at < %s, VALUES(owner), owner), "
+            "expires_at = IF(owner = VALUES(owner), VALUES(expires_at), expires_at)",
+            (session_file, owner, expires_at, now))
+        row = await self.fetchone("SELECT owner FROM account_leases WHERE session_file = %s", (session_file,))
+        return row is not None and row[0] == owner
+
+    # Amal qilayotgan ijaralarni uzaytirib, ularning ro'yxatini qaytaradi
+    async def renew_leases(self, owner, expires_at, now):
+        await self.execute("UPDATE account_leases SET expires_at = %s WHERE owner = %s AND expires_at >= %s", (expires_at, owner, now))
+        rows = await self.fetchall("SELECT session_file FROM account_leases WHERE owner = %s AND expires_at = %s", (owner, expires_at))
+        return [row[0] for row in rows]
+
+    async def release_lease(self, session_file, owner):
+        await self.execute("DELETE FROM account_leases WHERE session_file = %s AND owner = %s", (session_file, owner))
+
+    async def get_account_messages(self, session_file):
+        rows = await self.fetchall(
+            "SELECT m.message_id, m.user_id, m.phone, m.message_text, m.media_file_id, m.send_interval, m.next_run_at "
+            "FROM messages m JOIN accounts a ON a.user_id = m.user_id AND a.phone = m.phone "
+            "WHERE a.session_file = %s AND m.is_recurring = 1 AND m.paused = 0", (session_file,))
+        return await self._with_targets(rows)
+
+    async def get_message(self, message_id):
+        rows = await self.fetchall(
+            "SELECT message_id, user_id, phone, message_text, media_file_id, send_interval, next_run_at FROM messages "
+            "WHERE message_id = %s AND is_recurring = 1 AND paused = 0", (message_id,))
+        rows = await self._with_targets(rows)
+        return rows[0] if rows else None
+
+    async def _with_targets(self, rows):
+        targets = await self.get_targets([row[0] for row in rows])
+        return [(message_id, user_id, phone, targets[message_id], message_text, media_file_id, send_interval, next_run_at)
+                for message_id, user_id, phone, message_text, media_file_id, send_interval, next_run_at in rows]
+
+    # Xabar hodisalari (create / cancel) - worker lar kursor bo'yicha o'qiydi
+    async def add_message_event(self, message_id, event):
+        await self.execute("INSERT INTO message_events (message_id, event, created_at) VALUES (%s, %s, UNIX_TIMESTAMP())", (message_id, event))
+
+    async def add_message_events(self, message_ids, event):
+        await self.executemany("INSERT INTO message_events (message_id, event, created_at) VALUES (%s, %s, UNIX_TIMESTAMP())",
+                               [(message_id, event) for message_id in message_ids])
+
+    # Oxirgi sekunddagi hodisalar o'qilmaydi: parallel tranzaksiyalar tufayli event_id dagi "teshik"lar o'tkazib yuborilmasligi uchun
+    async def get_message_events(self, after_id, limit):
+        return await self.fetchall("SELECT event_id, message_id, event FROM message_events WHERE event_id > %s AND created_at < UNIX_TIMESTAMP() "
+                                   "ORDER BY event_id LIMIT %s", (after_id, limit))
+
+    async def get_last_message_event_id(self):
+        row = await self.fetchone("SELECT COALESCE(MAX(event_id), 0) FROM message_events")
+        return row[0]
+
+    async def delete_message_events_before(self, created_at):
+        await self.execute("DELETE FROM message_events WHERE created_at < %s", (created_at,))
+
+    # counters dagi hisoblagichni o'zgartirish; chaqiruvchining tranzaksiyasi ichida bajariladi
+    async def _count(self, c, name, delta):
+        await c.execute("INSERT INTO counters (name, value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE value = value + VALUES(value)", (name, delta))
+
+    # (foydalanuvchilar, akkauntlar, xabarlar) - counters jadvalidan, bitta so'rov bilan
+    async def get_stats(self):
+        rows = dict(await self.fetchall("SELECT name, value FROM counters"))
+        return tuple(rows.get(name, 0) for name in COUNTED_TABLES)
+
+    # Guruh/kanal entity keshi
+    async def get_cached_peers(self, session_file, min_resolved_at):
+        return await self.fetchall("SELECT peer_id, peer_type, entity_id, access_hash, resolved_at FROM peer_cache WHERE session_file = %s AND resolved_at >= %s",
+                                   (session_file, min_resolved_at))
+
+    async def save_cached_peers(self, rows):
+        await self.executemany(
+            "INSERT INTO peer_cache (session_file, peer_id, peer_type, entity_id, access_hash, resolved_at) VALUES (%s, %s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE peer_type = VALUES(peer_type), entity_id = VALUES(entity_id), access_hash = VALUES(access_hash), resolved_at = VALUES(resolved_at)",
+            rows)
+
+    async def delete_cached_peer(self, session_file, peer_id):
+        await self.execute("DELETE FROM peer_cache WHERE session_file = %s AND peer_id = %s", (session_file, peer_id))
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Yuborishlar jurnali: yozuvlar navbatga qo'yiladi va fon vazifasi ularni
+# hajm yoki vaqt chegarasiga yetganda ko'p qatorli INSERT bilan bazaga yozadi.
+# Navbat to'lsa record() kutadi (backpressure), stop() qolgan yozuvlarni yozib tugatadi.
+# Shu yozuvlar bilan message_targets dagi har bir qabul qiluvchi holati ham yangilanadi (checkpoint).
+class DeliveryLog:
+    def __init__(self, db, max_batch=500, flush_interval=2.0, max_queue=10000):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self.dropped = 0
+
+    async def record(self, message_id, peer_id, account, status, latency_ms, error=None):
+        if isinstance(error, BaseException):
+            error = f"{type(error).__name__}: {error}"
+        if error is not None:
+            error = str(error)[:255]
+        await self._queue.put((message_id, peer_id, account, status, int(latency_ms), error, int(time.time())))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            rows = []
+            item = await self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                rows.append(item)
+                timeout = deadline - time.monotonic()
+                if len(rows) >= self.max_batch or timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if rows:
+                await self._flush(rows)
+        # To'xtash belgisidan keyin kelib qolgan yozuvlar ham yoziladi
+        while not self._queue.empty():
+            rows = [self._queue.get_nowait() for _ in range(min(self.max_batch, self._queue.qsize()))]
+            await self._flush([row for row in rows if row is not None])
+
+    async def _flush(self, rows):
+        try:
+            await self.db.insert_deliveries(rows)
+            await self.db.checkpoint_targets(rows)
+        except Exception as e:
+            self.dropped += len(rows)
+            logger.error(f"Yuborishlar jurnalini yozishda xato ({len(rows)} ta yozuv yo'qoldi): {e}")
+
+    # Navbatdagi barcha yozuvlarni bazaga yozib, fon vazifasini to'xtatish
+    async def stop(self, timeout=10):
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Yuborishlar jurnali {timeout} s ichida yozib tugatilmadi")
+        self._task = None
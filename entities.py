@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RESOLVE_SECONDS = registry.histogram("tg_resolve_seconds", "get_input_entity() davomiyligi")
+LOOKUPS = registry.counter("entity_cache_lookups_total", "Entity keshi so'rovlari")
+
+
+def _dump_peer(peer):
+    if isinstance(peer, InputPeerChannel):
+        return "channel", peer.channel_id, peer.access_hash
+    if isinstance(peer, InputPeerChat):
+        return "chat", peer.chat_id, 0
+    if isinstance(peer, InputPeerUser):
+        return "user", peer.user_id, peer.access_hash
+    return None
+
+
+def _load_peer(peer_type, entity_id, access_hash):
+    if peer_type == "channel":
+        return InputPeerChannel(entity_id, access_hash)
+    if peer_type == "chat":
+        return InputPeerChat(entity_id)
+    if peer_type == "user":
+        return InputPeerUser(entity_id, access_hash)
+    return None
+
+
+# Ikki darajali InputPeer keshi: (akkaunt, peer_id) bo'yicha xotirada va peer_cache jadvalida.
+# Akkauntning saqlangan yozuvlari birinchi murojaatda bitta so'rov bilan yuklanadi.
+class EntityCache:
+    def __init__(self, db, ttl=7 * 24 * 3600, max_entries=100000, prewarm_concurrency=8):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prewarm_concurrency = prewarm_concurrency
+        self._entries = OrderedDict()
+        self._loaded = set()
+        self._load_locks = {}
+
+    def _get(self, key):
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+        peer, resolved_at = cached
+        if time.time() - resolved_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return peer
+
+    def _put(self, key, peer, resolved_at):
+        self._entries[key] = (peer, resolved_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _load_account(self, account):
+        if account in self._loaded:
+            return
+        if account not in self._load_locks:
+            self._load_locks[account] = asyncio.Lock()
+        async with self._load_locks[account]:
+            if account in self._loaded:
+                return
+            try:
+                rows = await self.db.get_cached_peers(account, int(time.time() - self.ttl))
+            except Exception as e:
+                logger.error(f"Entity keshini o'qishda xato ({account}): {e}")
+                return
+            for peer_id, peer_type, entity_id, access_hash, resolved_at in rows:
+                peer = _load_peer(peer_type, entity_id, access_hash)
+                if peer is not None:
+                    self._put((account, peer_id), peer, resolved_at)
+            self._loaded.add(account)
+            self._load_locks.pop(account, None)
+
+    # Keshdan yoki tarmoqdan InputPeer ni qaytaradi; yangi natija bazaga yoziladi
+    async def resolve(self, client, account, peer_id):
+        await self._load_account(account)
+        peer = self._get((account, peer_id))
+        LOOKUPS.inc(result="hit" if peer is not None else "miss")
+        if peer is None:
+            with RESOLVE_SECONDS.time():
+                peer = await client.get_input_entity(peer_id)
+            self._put((account, peer_id), peer, time.time())
+            await self._save([(account, peer_id, peer)])
+        return peer
+
+    async def _save(self, items):
+        rows = []
+        now = int(time.time())
+        for account, peer_id, peer in items:
+            dumped = _dump_peer(peer)
+            if dumped is not None:
+                rows.append((account, peer_id) + dumped + (now,))
+        try:
+            await self.db.save_cached_peers(rows)
+        except Exception as e:
+            logger.error(f"Entity keshini saqlashda xato: {e}")
+
+    async def invalidate(self, account, peer_id):
+        self._entries.pop((account, peer_id), None)
+        try:
+            await self.db.delete_cached_peer(account, peer_id)
+        except Exception as e:
+            logger.error(f"Entity keshidan o'chirishda xato: {e}")
+
+    # Ko'p guruhni oldindan aniqlash (parallel, cheklangan); {peer_id: xato} qaytaradi. errors - guruhning
+    # o'ziga tegishli xatolar (Telethon topilmagan ID uchun ValueError beradi), boshqa xato butun tekshiruvni to'xtatadi.
+    # on_progress(done, total, failed_count) - har bir ID tekshirilgach chaqiriladigan korutina
+    async def prewarm(self, client, account, peer_ids, errors=(Exception,), on_progress=None):
+        semaphore = asyncio.Semaphore(self.prewarm_concurrency)
+        failed = {}
+        fresh = []
+        done = 0
+
+        async def resolve(peer_id):
+            if self._get((account, peer_id)) is not None:
+                return
+            async with semaphore:
+                try:
+                    with RESOLVE_SECONDS.time():
+                        peer = await client.get_input_entity(peer_id)
+                except errors as e:
+                    failed[peer_id] = e
+                    return
+            self._put((account, peer_id), peer, time.time())
+            fresh.append((account, peer_id, peer))
+
+        async def one(peer_id):
+            nonlocal done
+            await resolve(peer_id)
+            done += 1
+            if on_progress is not None:
+                await on_progress(done, len(peer_ids), len(failed))
+
+        await self._load_account(account)
+        tasks = [asyncio.ensure_future(one(peer_id)) for peer_id in peer_ids]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Kutilmagan xatoda qolgan aniqlashlar to'xtatiladi (holat xabarini keyin tahrirlamasligi uchun)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            await self._save(fresh)
+        return failed
@@ -1,13 +1,33 @@
+import argparse
 import asyncio
 import logging
-import aiomysql
+import signal
+import socket
+from contextlib import asynccontextmanager
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError, ChannelInvalidError, ChannelPrivateError, PeerIdInvalidError
-from telethon.sessions import SQLiteSession
 import os
+import random
+import time
 from dotenv import load_dotenv
+from db import Database
+from clients import ClientManager
+from media_cache import MediaCache
+from scheduler import Scheduler
+from ratelimit import WarmupLimiter, SendLimiter
+from sender import Dispatcher, SENT, FAILED, DEFERRED
+from entities import EntityCache
+from deliveries import DeliveryLog
+from webhook import WebhookServer
+from state import MemoryStateStore, SqlStateStore, ClientRegistry, LockRegistry, run_state_cleanup
+from worker import ShardCoordinator
+from metrics import registry as metrics, MetricsServer
+from session_store import SqlSessionStore, SqliteSessionStore
+from notify import Notifier
+from cache import TTLCache
+from profiling import Profiler
+import bulk_import
 
 # .env faylidan sozlamalarni o‘qish
 load_dotenv()
@@ -19,6 +39,62 @@ MYSQL_USER = os.getenv('MYSQL_USER')
 MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
 MYSQL_DB = os.getenv('MYSQL_DB')
 ADMIN_USER_ID = int(os.getenv('ADMIN_USER_ID', 5764455157))  # .env dan yoki default qiymat
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+TG_CLIENT_IDLE_TTL = int(os.getenv('TG_CLIENT_IDLE_TTL', 900))  # sekundda
+TG_MAX_CLIENTS = int(os.getenv('TG_MAX_CLIENTS', 0))  # 0 - cheklovsiz
+MEDIA_CACHE_MB = int(os.getenv('MEDIA_CACHE_MB', 64))
+MEDIA_UPLOAD_TTL = int(os.getenv('MEDIA_UPLOAD_TTL', 3600))  # sekundda
+SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', 16))
+RESTORE_CHUNK_SIZE = int(os.getenv('RESTORE_CHUNK_SIZE', 500))
+RESTORE_JITTER = os.getenv('RESTORE_JITTER', 'phase')  # phase | random
+WARMUP_SECONDS = int(os.getenv('WARMUP_SECONDS', 300))
+WARMUP_CONNECTS_PER_SEC = float(os.getenv('WARMUP_CONNECTS_PER_SEC', 2))
+WARMUP_SENDS_PER_SEC = float(os.getenv('WARMUP_SENDS_PER_SEC', 10))
+ACCOUNT_SENDS_PER_SEC = float(os.getenv('ACCOUNT_SENDS_PER_SEC', 1))
+PEER_SENDS_PER_SEC = float(os.getenv('PEER_SENDS_PER_SEC', 0.2))
+FLOOD_WAIT_MAX_SLEEP = int(os.getenv('FLOOD_WAIT_MAX_SLEEP', 60))  # bundan uzun FloodWait da sikl keyingi safarga qoldiriladi
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', 32))  # barcha akkauntlar bo'yicha bir vaqtdagi yuborishlar
+ACCOUNT_SEND_CONCURRENCY = int(os.getenv('ACCOUNT_SEND_CONCURRENCY', 2))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 3))
+ENTITY_CACHE_TTL = int(os.getenv('ENTITY_CACHE_TTL', 7 * 24 * 3600))  # sekundda
+DELIVERY_LOG_BATCH = int(os.getenv('DELIVERY_LOG_BATCH', 500))
+DELIVERY_LOG_FLUSH_INTERVAL = float(os.getenv('DELIVERY_LOG_FLUSH_INTERVAL', 2))  # sekundda
+DELIVERY_LOG_QUEUE = int(os.getenv('DELIVERY_LOG_QUEUE', 10000))
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # tashqi manzil; berilsa set_webhook chaqiriladi
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 32))
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')  # memory | mysql
+STATE_TTL = int(os.getenv('STATE_TTL', 3600))  # sekundda
+STATE_MAX_ENTRIES = int(os.getenv('STATE_MAX_ENTRIES', 10000))
+LOGIN_CLIENT_TTL = int(os.getenv('LOGIN_CLIENT_TTL', 600))  # tugallanmagan login klienti shu vaqtdan keyin uziladi
+SENDER_MODE = os.getenv('SENDER_MODE', 'embedded')  # embedded - bot o'zi yuboradi | external - alohida worker jarayonlar yuboradi
+WORKER_LEASE_TTL = int(os.getenv('WORKER_LEASE_TTL', 30))  # sekundda
+WORKER_HEARTBEAT = int(os.getenv('WORKER_HEARTBEAT', 10))  # sekundda
+WORKER_EVENT_POLL = float(os.getenv('WORKER_EVENT_POLL', 1))  # sekundda
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'files')  # files - har akkauntga .session fayl | mysql | sqlite - bitta umumiy ombor
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions/sessions.db')  # SESSION_BACKEND=sqlite uchun
+NOTIFY_WINDOW = int(os.getenv('NOTIFY_WINDOW', 60))  # sekundda, shu vaqt ichidagi xatolar bitta xabarda yuboriladi
+NOTIFY_REPEAT_AFTER = int(os.getenv('NOTIFY_REPEAT_AFTER', 3600))  # bir xil xato shundan keyin qayta xabar qilinadi
+NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', 10))  # xabarnomalar uchun Bot API ulushi, sekundiga
+VALIDATION_PROGRESS_INTERVAL = float(os.getenv('VALIDATION_PROGRESS_INTERVAL', 2))  # sekundda, holat xabari tahrirlari orasidagi minimal vaqt
+VALIDATION_CONCURRENCY = int(os.getenv('VALIDATION_CONCURRENCY', 8))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))  # sekundda, akkauntlar va balans keshi
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 50000))
+SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', 30))  # sekundda, to'xtashda bajarilayotgan yuborishlarni kutish
+IMPORT_CONCURRENCY = int(os.getenv('IMPORT_CONCURRENCY', 4))  # ommaviy importda bir vaqtda tekshiriladigan akkauntlar
+IMPORT_MAX_FILE_SIZE = int(os.getenv('IMPORT_MAX_FILE_SIZE', 5 * 1024 * 1024))  # baytda
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))  # 0 - /metrics o'chirilgan
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 0))  # --mode worker uchun; bir xostdagi har worker ga alohida port, 0 - o'chirilgan
+PROFILE_TRACE_PATH = os.getenv('PROFILE_TRACE_PATH', 'profile/trace.jsonl')  # --profile rejimidagi trace fayli
+PROFILE_TRACE_MAX_BYTES = int(os.getenv('PROFILE_TRACE_MAX_BYTES', 10 * 1024 * 1024))  # shundan keyin fayl aylantiriladi
+PROFILE_TRACE_BACKUPS = int(os.getenv('PROFILE_TRACE_BACKUPS', 5))
+PROFILE_LAG_INTERVAL = float(os.getenv('PROFILE_LAG_INTERVAL', 0.1))  # sekundda, event loop kechikishini o'lchash oralig'i
+PROFILE_SLOW_CALLBACK = float(os.getenv('PROFILE_SLOW_CALLBACK', 0.1))  # sekundda, loop shundan uzoq to'silsa stek yoziladi
 
 # Logging sozlamalari
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,71 +102,84 @@ logger = logging.getLogger(__name__)
 
 bot = AsyncTeleBot(API_TOKEN)
 
-# Sessiya va ma'lumotlar bazasi locklari
-session_locks = {}
-db_lock = asyncio.Lock()
-
-# MySQL ulanish pooli
-async def create_db_pool():
-    return await aiomysql.create_pool(
-        host=MYSQL_HOST,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWORD,
-        db=MYSQL_DB,
-        autocommit=True
-    )
+# Sessiya locklari (ishlatilmayotganlari o'chiriladi)
+session_locks = LockRegistry()
+
+# MySQL: butun jarayon uchun bitta umumiy pool (main() da ochiladi)
+db = Database(MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, minsize=DB_POOL_MIN, maxsize=DB_POOL_MAX)
+
+# Qayta ishga tushgandan keyin ulanish va yuborishlarning global cheklovi
+warmup = WarmupLimiter(WARMUP_SECONDS, WARMUP_CONNECTS_PER_SEC, WARMUP_SENDS_PER_SEC)
+
+# Akkaunt va guruh bo'yicha yuborish tezligi cheklovi (FloodWait ga moslashadi)
+send_limiter = SendLimiter(account_rate=ACCOUNT_SENDS_PER_SEC, peer_rate=PEER_SENDS_PER_SEC)
+
+# Telethon sessiyalari ombori (migratsiya: python -m session_store --backend mysql|sqlite)
+if SESSION_BACKEND == "mysql":
+    session_store = SqlSessionStore(db)
+elif SESSION_BACKEND == "sqlite":
+    session_store = SqliteSessionStore(SESSION_DB_PATH)
+else:
+    session_store = None
+
+# Akkauntlar bo'yicha doimiy ulangan Telegram klientlari (sessiyalar birinchi ishlatilganda ochiladi)
+clients = ClientManager(API_ID, API_HASH, idle_ttl=TG_CLIENT_IDLE_TTL, max_clients=TG_MAX_CLIENTS,
+                        before_connect=warmup.acquire_connect, session_store=session_store)
+
+# Media fayllar keshi: har bir rasm bir marta yuklab olinadi va har bir akkauntga bir marta yuklanadi
+media_cache = MediaCache(bot, max_bytes=MEDIA_CACHE_MB * 1024 * 1024, upload_ttl=MEDIA_UPLOAD_TTL)
+
+# Guruh/kanal InputPeer lari keshi (xotira + peer_cache jadvali)
+entity_cache = EntityCache(db, ttl=ENTITY_CACHE_TTL, prewarm_concurrency=VALIDATION_CONCURRENCY)
+
+# Yuborish natijalari jurnali (deliveries jadvaliga to'plab yoziladi)
+delivery_log = DeliveryLog(db, max_batch=DELIVERY_LOG_BATCH, flush_interval=DELIVERY_LOG_FLUSH_INTERVAL, max_queue=DELIVERY_LOG_QUEUE)
+
+# Xato xabarnomalari birlashtirilib, cheklangan tezlikda yuboriladi
+notifier = Notifier(bot, window=NOTIFY_WINDOW, repeat_after=NOTIFY_REPEAT_AFTER, global_rate=NOTIFY_GLOBAL_RATE)
+
+# Guruhlarga yuborish uchun xato xabarnomasi
+async def report_send_error(user_id, message_id, gid, error):
+    notifier.notify(user_id, message_id, type(error).__name__, f"❌ Kanallarga yuborishda xato: {error}", peer=gid)
+
+# Xabarlarni guruhlarga parallel tarqatuvchi
+dispatcher = Dispatcher(clients, send_limiter, media_cache, warmup=warmup, entity_cache=entity_cache,
+                        global_concurrency=SEND_CONCURRENCY, account_concurrency=ACCOUNT_SEND_CONCURRENCY,
+                        max_retries=SEND_MAX_RETRIES, max_flood_sleep=FLOOD_WAIT_MAX_SLEEP,
+                        on_error=report_send_error, delivery_log=delivery_log)
 
 # Ma'lumotlar bazasini boshlash
 async def init_db():
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute('''CREATE TABLE IF NOT EXISTS users (
-                                    user_id BIGINT PRIMARY KEY,
-                                    balance INT DEFAULT 0
-                                )''')
-                await c.execute('''CREATE TABLE IF NOT EXISTS accounts (
-                                    user_id BIGINT,
-                                    phone VARCHAR(20),
-                                    session_file VARCHAR(255),
-                                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                                )''')
-                await c.execute('''CREATE TABLE IF NOT EXISTS messages (
-                                    message_id BIGINT AUTO_INCREMENT PRIMARY KEY,
-                                    user_id BIGINT,
-                                    phone VARCHAR(20),
-                                    group_ids TEXT,
-                                    message_text TEXT,
-                                    media_file_id VARCHAR(255),
-                                    send_interval INT,
-                                    is_recurring INT DEFAULT 0,
-                                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                                )''')
-        pool.close()
-        await pool.wait_closed()
+    await db.connect()
+    await db.init_schema()
 
 # Sessiya lockini olish
 def get_session_lock(session_file):
-    if session_file not in session_locks:
-        session_locks[session_file] = asyncio.Lock()
-    return session_locks[session_file]
+    return session_locks.hold(session_file)
+
+# Foydalanuvchi suhbat holatlari (JSON ga aylantiriladigan dict lar)
+if STATE_BACKEND == "mysql":
+    states = SqlStateStore(db, ttl=STATE_TTL)
+else:
+    states = MemoryStateStore(max_entries=STATE_MAX_ENTRIES, ttl=STATE_TTL)
 
-# Foydalanuvchi ma'lumotlari
-user_data = {}
-recurring_tasks = {}
+# Login jarayonidagi klientlar: muddati o'tsa uziladi
+login_clients = ClientRegistry(ttl=LOGIN_CLIENT_TTL)
+
+# Menyu uchun foydalanuvchi ma'lumotlari keshi; yozishlarda (login, balans o'zgarishi) tozalanadi
+user_cache = TTLCache(ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX_ENTRIES)
+
+async def get_accounts(user_id):
+    return await user_cache.get(("accounts", user_id), lambda: db.get_accounts(user_id))
+
+async def get_balance(user_id):
+    return await user_cache.get(("balance", user_id), lambda: db.get_balance(user_id))
 
 # Boshlang‘ich xabar
 @bot.message_handler(commands=['start'])
 async def send_welcome(message):
     user_id = message.from_user.id
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute("INSERT IGNORE INTO users (user_id, balance) VALUES (%s, 0)", (user_id,))
-        pool.close()
-        await pool.wait_closed()
+    await db.add_user(user_id)
 
     markup = InlineKeyboardMarkup()
     markup.row_width = 1
@@ -103,14 +192,14 @@ async def send_welcome(message):
     await bot.send_message(message.chat.id, "Assalomu alaykum! Botimizga hush kelibsiz! Kerakli bo‘limni tanlang 👇", reply_markup=markup)
 
 # Callback so'rovlarni qayta ishlash
-@bot.callback_query_handler(func=lambda call: True)
+@bot.callback_query_handler(func=lambda call: call.data not in ADMIN_CALLBACKS)
 async def callback_query(call):
     user_id = call.from_user.id
     try:
         if call.data == "my_accounts":
             await show_accounts(call)
         elif call.data == "add_account":
-            user_data[user_id] = {"step": "phone"}
+            await states.set(user_id, {"step": "phone"})
             await bot.send_message(call.message.chat.id, "📱 Telefon raqamni kiriting (+998xxxxxxxxx):")
         elif call.data == "my_balance":
             await show_balance(call)
@@ -118,17 +207,10 @@ async def callback_query(call):
             await show_recurring_messages(call)
         elif call.data.startswith("account_"):
             account_index = int(call.data.split("_")[1])
-            async with db_lock:
-                pool = await create_db_pool()
-                async with pool.acquire() as conn:
-                    async with conn.cursor() as c:
-                        await c.execute("SELECT phone FROM accounts WHERE user_id = %s", (user_id,))
-                        accounts = await c.fetchall()
-                pool.close()
-                await pool.wait_closed()
+            accounts = await get_accounts(user_id)
             if account_index < len(accounts):
-                user_data[user_id] = {"selected_phone": accounts[account_index][0], "step": "group_ids"}
-                await bot.send_message(call.message.chat.id, f"📞 {accounts[account_index][0]} raqami tanlandi. Guruh yoki kanal ID larini kiriting (vergul bilan ajrating, masalan: -100123456789,-100987654321):")
+                await states.set(user_id, {"selected_phone": accounts[account_index], "step": "group_ids"})
+                await bot.send_message(call.message.chat.id, f"📞 {accounts[account_index]} raqami tanlandi. Guruh yoki kanal ID larini kiriting (vergul bilan ajrating, masalan: -100123456789,-100987654321):")
         elif call.data == "top_up_balance":
             await bot.send_message(call.message.chat.id, "Hisobni to‘ldirish uchun @Baxriddinovich_dev ga murojaat qiling.",
                                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("To‘lov qilish", url="https://t.me/Baxriddinovich_dev")]]))
@@ -144,14 +226,7 @@ async def callback_query(call):
 # Akkauntlarni ko‘rsatish
 async def show_accounts(call):
     user_id = call.from_user.id
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute("SELECT phone FROM accounts WHERE user_id = %s", (user_id,))
-                accounts = await c.fetchall()
-        pool.close()
-        await pool.wait_closed()
+    accounts = await get_accounts(user_id)
 
     if not accounts:
         await bot.send_message(call.message.chat.id, "Sizda hali hech qanday akkaunt yo‘q.")
@@ -159,7 +234,7 @@ async def show_accounts(call):
 
     text = "Sizning akkauntlaringiz:\n"
     for i, account in enumerate(accounts, 1):
-        text += f"{i}. {account[0]}\n"
+        text += f"{i}. {account}\n"
 
     markup = InlineKeyboardMarkup()
     for i in range(len(accounts)):
@@ -170,14 +245,7 @@ async def show_accounts(call):
 # Hisobni ko‘rsatish
 async def show_balance(call):
     user_id = call.from_user.id
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
-                balance = (await c.fetchone())[0]
-        pool.close()
-        await pool.wait_closed()
+    balance = await get_balance(user_id)
 
     text = f"Sizning ID: {user_id}\nSizning hisobingiz: {balance} so‘m"
     markup = InlineKeyboardMarkup()
@@ -188,14 +256,7 @@ async def show_balance(call):
 # Takroriy xabarlarni ko‘rsatish
 async def show_recurring_messages(call):
     user_id = call.from_user.id
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute("SELECT message_id, group_ids, message_text, send_interval FROM messages WHERE user_id = %s AND is_recurring = 1", (user_id,))
-                messages = await c.fetchall()
-        pool.close()
-        await pool.wait_closed()
+    messages = await db.get_recurring_messages(user_id)
 
     if not messages:
         await bot.send_message(call.message.chat.id, "Sizda takroriy xabarlar yo‘q.")
@@ -205,79 +266,102 @@ async def show_recurring_messages(call):
     markup = InlineKeyboardMarkup()
     for msg in messages:
         message_id, group_ids, message_text, send_interval = msg
-        text += f"ID: {message_id}, Kanallar: {group_ids}, Matn: {message_text}, Interval: {send_interval} min\n"
+        text += f"ID: {message_id}, Kanallar: {','.join(map(str, group_ids))}, Matn: {message_text}, Interval: {send_interval} min\n"
         markup.add(InlineKeyboardButton(f"Cancel ID {message_id}", callback_data=f"cancel_{message_id}"))
     markup.add(InlineKeyboardButton("Ortga qaytish", callback_data="back"))
     await bot.send_message(call.message.chat.id, text, reply_markup=markup)
 
 # Takroriy xabarni bekor qilish
 async def cancel_recurring_message(user_id, message_id, chat_id):
-    if (user_id, message_id) in recurring_tasks:
-        recurring_tasks[(user_id, message_id)].cancel()
-        del recurring_tasks[(user_id, message_id)]
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute("DELETE FROM messages WHERE message_id = %s AND user_id = %s", (message_id, user_id))
-        pool.close()
-        await pool.wait_closed()
+    if await db.delete_message(message_id, user_id):
+        if SENDER_MODE == "external":
+            await db.add_message_event(message_id, "cancel")
+        else:
+            scheduler.cancel(message_id)
     await bot.send_message(chat_id, f"Xabar ID {message_id} bekor qilindi.")
 
-# Matn va rasm xabarlarini qayta ishlash
-@bot.message_handler(content_types=['text', 'photo'])
+# Tekshirishda guruhning o'ziga tegishli xatolar: noma'lum yoki noto'g'ri ID uchun get_input_entity
+# ChannelInvalidError ni yutib, ValueError beradi
+RESOLVE_ERRORS = (ChannelInvalidError, ChannelPrivateError, PeerIdInvalidError, ValueError)
+
+# Guruh ID larini tekshirish jarayoni bitta xabarni tahrirlab ko'rsatiladi (tahrirlar siyraklashtiriladi)
+async def validation_progress(chat_id, total):
+    status = await bot.send_message(chat_id, f"⏳ Guruhlar tekshirilmoqda: 0/{total}")
+    last_edit = time.monotonic()
+
+    async def progress(done, total, failed):
+        nonlocal last_edit
+        now = time.monotonic()
+        if done < total and now - last_edit < VALIDATION_PROGRESS_INTERVAL:
+            return
+        last_edit = now
+        text = f"✅ Guruhlar tekshirildi: {done}/{total}" if done == total else f"⏳ Guruhlar tekshirilmoqda: {done}/{total}"
+        if failed:
+            text += f", xato: {failed}"
+        try:
+            await bot.edit_message_text(text, chat_id, status.message_id)
+        except Exception as e:
+            logger.warning(f"Tekshirish holatini yangilashda xato: {e}")
+    return progress
+
+# Matn va rasm xabarlarini qayta ishlash. Buyruqlar o'tkazib yuboriladi: telebot faqat birinchi mos
+# handlerni chaqiradi, aks holda keyin ro'yxatdan o'tgan /admin bu yerda qolib ketadi
+@bot.message_handler(content_types=['text', 'photo'], func=lambda message: not (message.text or "").startswith("/"))
 async def handle_text_photo(message):
     user_id = message.from_user.id
-    if user_id not in user_data:
+    state = await states.get(user_id)
+    if state is None:
         return
 
-    step = user_data[user_id].get("step")
+    step = state.get("step")
     if step == "phone":
         phone = message.text.strip().replace(" ", "")
         if not phone.startswith("+998") or len(phone) != 13:
             await bot.send_message(message.chat.id, "❌ Raqam noto‘g‘ri. Iltimos, +998xxxxxxxxx formatida kiriting.")
             return
-        user_data[user_id]["phone"] = phone
-        user_data[user_id]["step"] = "code"
+        state["phone"] = phone
+        state["step"] = "code"
+        await states.set(user_id, state)
         await bot.send_message(message.chat.id, "⏳ Kod yuborilmoqda...")
         await send_code_request(user_id, phone)
     elif step == "code":
-        user_data[user_id]["code"] = message.text.strip()
-        user_data[user_id]["step"] = "password"
+        state["code"] = message.text.strip()
+        state["step"] = "password"
+        await states.set(user_id, state)
         await bot.send_message(message.chat.id, "🔐 2-bosqichli parolni kiriting:")
     elif step == "password":
         password = message.text.strip()
-        await complete_login(user_id, message, password)
+        await complete_login(user_id, message, password, state)
     elif step == "group_ids":
         try:
-            group_ids = [int(gid) for gid in message.text.split(",") if gid.strip()]
-            session_file = f"sessions/session_{user_id}_{user_data[user_id]['selected_phone']}.session"
-            async with get_session_lock(session_file):
-                client = TelegramClient(session_file, api_id=API_ID, api_hash=API_HASH, session=SQLiteSession(session_file))
-                await client.connect()
-                if not await client.is_user_authorized():
+            group_ids = list(dict.fromkeys(int(gid) for gid in message.text.split(",") if gid.strip()))
+            session_file = f"sessions/session_{user_id}_{state['selected_phone']}.session"
+            # Sessiya lockisiz: umumiy klient yuborishlar bilan birga ishlatiladi, ularni to'xtatmaydi
+            async with validation_client(session_file) as client:
+                if client is None:
                     await bot.send_message(message.chat.id, "❌ Akkaunt avtorizatsiya qilinmagan.")
-                    await client.disconnect()
                     return
-                invalid_ids = []
-                for gid in group_ids:
-                    try:
-                        await client.get_input_entity(gid)
-                    except (ChannelInvalidError, ChannelPrivateError, PeerIdInvalidError):
-                        invalid_ids.append(gid)
-                await client.disconnect()
+                # Aniqlangan entity lar keshga yoziladi va keyingi yuborishlarda qayta ishlatiladi
+                progress = await validation_progress(message.chat.id, len(group_ids))
+                failed = await entity_cache.prewarm(client, session_file, group_ids, errors=RESOLVE_ERRORS, on_progress=progress)
+                invalid_ids = [gid for gid in group_ids if gid in failed]
                 if invalid_ids:
                     await bot.send_message(message.chat.id, f"❌ Quyidagi ID lar noto‘g‘ri yoki kirish huquqi yo‘q: {invalid_ids}. Iltimos, to‘g‘ri ID larni kiriting.")
                     return
-            user_data[user_id]["group_ids"] = group_ids
-            user_data[user_id]["step"] = "message_content"
+            state["group_ids"] = group_ids
+            state["step"] = "message_content"
+            await states.set(user_id, state)
             await bot.send_message(message.chat.id, "📝 Yuboriladigan xabar matnini kiriting yoki rasm yuboring:")
         except ValueError:
             await bot.send_message(message.chat.id, "Iltimos, to‘g‘ri guruh yoki kanal ID larini kiriting (masalan: -100123456789,-100987654321).")
+        except Exception as e:
+            logger.error(f"Guruh ID larini tekshirishda xato: {e}")
+            await bot.send_message(message.chat.id, f"❌ Guruhlarni tekshirishda xato: {e}. Keyinroq qayta urinib ko‘ring.")
     elif step == "message_content":
-        user_data[user_id]["message_text"] = message.text if message.text else ""
-        user_data[user_id]["media_file_id"] = message.photo[-1].file_id if message.photo else None
-        user_data[user_id]["step"] = "send_interval"
+        state["message_text"] = message.text if message.text else ""
+        state["media_file_id"] = message.photo[-1].file_id if message.photo else None
+        state["step"] = "send_interval"
+        await states.set(user_id, state)
         await bot.send_message(message.chat.id, "⏰ Xabar har qancha vaqtda takrorlanib yuborilsin (minutda)?")
     elif step == "send_interval":
         try:
@@ -285,51 +369,58 @@ async def handle_text_photo(message):
             if send_interval <= 0:
                 await bot.send_message(message.chat.id, "Iltimos, 1 yoki undan katta raqam kiriting.")
                 return
-            user_data[user_id]["send_interval"] = send_interval
-            await schedule_message(user_id)
+            state["send_interval"] = send_interval
+            await schedule_message(user_id, state)
             await bot.send_message(message.chat.id, f"✅ Xabar har {send_interval} minutda yuboriladi.")
-            user_data[user_id]["step"] = None
+            await states.delete(user_id)
         except ValueError:
             await bot.send_message(message.chat.id, "Iltimos, raqam kiriting.")
+    elif step == "manage_user_id":
+        await manage_user_id(message, state)
+    elif step == "manage_funds":
+        await manage_funds(message, state)
 
 # Telegram kirish
 async def send_code_request(user_id, phone):
     os.makedirs("sessions", exist_ok=True)
     session_file = f"sessions/session_{user_id}_{phone}.session"
     async with get_session_lock(session_file):
-        client = TelegramClient(session_file, api_id=API_ID, api_hash=API_HASH, session=SQLiteSession(session_file, timeout=10))
         try:
+            client = await clients.open_client(session_file)
             await client.connect()
             if not await client.is_user_authorized():
                 sent_code = await client.send_code_request(phone)
-                user_data[user_id]["phone_code_hash"] = sent_code.phone_code_hash
-                user_data[user_id]["client"] = client
+                await login_clients.put(user_id, client)
+                state = await states.get(user_id) or {}
+                state["phone_code_hash"] = sent_code.phone_code_hash
+                await states.set(user_id, state)
                 await bot.send_message(user_id, "✅ Kod yuborildi! 📩 SMS kodni kiriting:")
             else:
-                await client.disconnect()
+                await hand_over_client(session_file, client)
         except Exception as e:
             logger.error(f"Kod yuborish xatosi: {e}")
             await bot.send_message(user_id, f"❌ Kod yuborish xatosi: {e}")
 
-async def complete_login(user_id, message, password):
-    phone = user_data[user_id]["phone"]
-    code = user_data[user_id]["code"]
-    phone_code_hash = user_data[user_id].get("phone_code_hash")
-    client = user_data[user_id].get("client")
+async def complete_login(user_id, message, password, state):
+    phone = state["phone"]
+    code = state["code"]
+    phone_code_hash = state.get("phone_code_hash")
+    client = login_clients.get(user_id)
     session_file = f"sessions/session_{user_id}_{phone}.session"
 
     async with get_session_lock(session_file):
         if not client:
-            client = TelegramClient(session_file, api_id=API_ID, api_hash=API_HASH, session=SQLiteSession(session_file, timeout=10))
+            client = await clients.open_client(session_file)
             await client.connect()
+            await login_clients.put(user_id, client)
 
         try:
             if not await client.is_user_authorized():
                 try:
                     await client.sign_in(phone, code, phone_code_hash=phone_code_hash)
                     await bot.send_message(message.chat.id, "❌ Faqat ikki bosqichli tasdiqlash (2FA) yoqilgan akkauntlar qabul qilinadi.")
-                    user_data[user_id]["step"] = None
-                    user_data[user_id]["client"] = None
+                    await states.delete(user_id)
+                    await login_clients.discard(user_id)
                     return
                 except SessionPasswordNeededError:
                     if not password:
@@ -339,89 +430,144 @@ async def complete_login(user_id, message, password):
                         await client.sign_in(password=password)
                     except Exception as e:
                         await bot.send_message(message.chat.id, f"❌ Parol noto‘g‘ri: {e}.")
-                        user_data[user_id]["step"] = "password"
+                        state["step"] = "password"
+                        await states.set(user_id, state)
                         return
-            async with db_lock:
-                pool = await create_db_pool()
-                async with pool.acquire() as conn:
-                    async with conn.cursor() as c:
-                        await c.execute("INSERT INTO accounts (user_id, phone, session_file) VALUES (%s, %s, %s)", (user_id, phone, session_file))
-                pool.close()
-                await pool.wait_closed()
+            await db.add_account(user_id, phone, session_file)
+            user_cache.invalidate(("accounts", user_id))
             await bot.send_message(message.chat.id, "✅ Akkaunt muvaffaqiyatli qo‘shildi!")
-            user_data[user_id]["step"] = None
-            user_data[user_id]["client"] = None
-            await client.disconnect()
+            await states.delete(user_id)
+            await hand_over_client(session_file, login_clients.pop(user_id))
+            await resume_account(user_id, phone)
         except Exception as e:
             logger.error(f"Kirish xatosi: {e}")
             await bot.send_message(message.chat.id, f"❌ Kirish xatosi: {e}")
 
+# Avtorizatsiyadan o'tgan klient yuborishlar uchun menejerga topshiriladi. external rejimda yuborishni
+# worker bajaradi: bot jarayoni sessiyani (auth key, .session fayl) worker bilan birga ushlab turmaydi
+async def hand_over_client(session_file, client):
+    if SENDER_MODE == "external":
+        await client.disconnect()
+    else:
+        await clients.adopt(session_file, client)
+
+# Guruhlarni tekshirish uchun klient; external rejimda tekshiruvdan keyin darhol uziladi
+@asynccontextmanager
+async def validation_client(session_file):
+    try:
+        async with clients.use(session_file) as client:
+            yield client
+    finally:
+        if SENDER_MODE == "external":
+            await clients.release(session_file)
+
 # Xabar yuborishni rejalashtirish
-async def schedule_message(user_id):
-    phone = user_data[user_id]["selected_phone"]
-    group_ids = user_data[user_id]["group_ids"]
-    message_text = user_data[user_id]["message_text"]
-    media_file_id = user_data[user_id]["media_file_id"]
-    send_interval = user_data[user_id]["send_interval"]
-
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute("INSERT INTO messages (user_id, phone, group_ids, message_text, media_file_id, send_interval, is_recurring) VALUES (%s, %s, %s, %s, %s, %s, 1)",
-                                (user_id, phone, ",".join(map(str, group_ids)), message_text, media_file_id, send_interval))
-                message_id = c.lastinsertid
-        pool.close()
-        await pool.wait_closed()
-
-    task = asyncio.create_task(run_recurring_message(user_id, message_id, phone, group_ids, message_text, media_file_id, send_interval))
-    recurring_tasks[(user_id, message_id)] = task
-
-async def run_recurring_message(user_id, message_id, phone, group_ids, message_text, media_file_id, send_interval):
+async def schedule_message(user_id, state):
+    phone = state["selected_phone"]
+    group_ids = state["group_ids"]
+    message_text = state["message_text"]
+    media_file_id = state["media_file_id"]
+    send_interval = state["send_interval"]
+
+    next_run_at = int(time.time())
+    message_id = await db.insert_message(user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at)
+    if SENDER_MODE == "external":
+        await db.add_message_event(message_id, "create")
+    else:
+        add_recurring_job(message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at)
+
+# resume_after berilsa birinchi ishga tushishda shu vaqtdan beri yuborilmagan guruhlargagina yuboriladi
+def add_recurring_job(message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at=None, resume_after=None):
+    payload = recurring_payload(user_id, phone, group_ids, message_text, media_file_id, resume_after)
+    scheduler.add(message_id, send_interval * 60, payload, next_run=next_run_at)
+
+def recurring_payload(user_id, phone, group_ids, message_text, media_file_id, resume_after=None):
+    return {
+        "user_id": user_id,
+        "phone": phone,
+        "group_ids": group_ids,
+        "message_text": message_text,
+        "media_file_id": media_file_id,
+        "resume_after": resume_after,
+    }
+
+# Bazadagi xabarni rejalashtiruvchiga qaytarish. Saqlangan next_run_at o'tib ketgan bo'lsa, o'sha sikl
+# boshlangan-u tugamagan bo'lishi mumkin: undan keyin yuborilgan guruhlar (last_sent_at) takrorlanmaydi
+def restore_job(msg, now):
+    message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at = msg
+    first_run = restore_first_run(message_id, send_interval, next_run_at, now)
+    resume_after = next_run_at if next_run_at is not None and next_run_at < now else None
+    add_recurring_job(message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval, first_run, resume_after)
+
+async def run_recurring_message(job):
+    user_id = job.payload["user_id"]
+    session_file = f"sessions/session_{user_id}_{job.payload['phone']}.session"
+    if coordinator is not None and not coordinator.owns(session_file):
+        logger.warning(f"Takroriy xabar {job.job_id} o'tkazib yuborildi: {session_file} ijarasi amal qilmaydi")
+        return
+    payload = job.payload
     try:
-        while True:
-            await send_message_to_channels(user_id, phone, group_ids, message_text, media_file_id)
-            await asyncio.sleep(send_interval * 60)
-    except asyncio.CancelledError:
-        logger.info(f"Takroriy xabar {message_id} foydalanuvchi {user_id} uchun bekor qilindi")
+        group_ids = payload["group_ids"]
+        resume_after = payload.pop("resume_after", None)
+        if resume_after is not None:
+            group_ids = await db.get_unsent_targets(job.job_id, resume_after)
+            logger.info(f"Takroriy xabar {job.job_id} uzilgan sikldan davom etmoqda: {len(group_ids)}/{len(payload['group_ids'])} ta guruh qoldi")
+        await send_message_to_channels(job.job_id, user_id, payload["phone"], group_ids, payload["message_text"], payload["media_file_id"])
     except Exception as e:
-        logger.error(f"Takroriy xabar {message_id} da xato: {e}")
-        await bot.send_message(user_id, f"❌ Takroriy xabar yuborishda xato: {e}")
+        logger.error(f"Takroriy xabar {job.job_id} da xato: {e}")
+        notifier.notify(user_id, job.job_id, type(e).__name__, f"❌ Takroriy xabar yuborishda xato: {e}")
+
+async def save_next_run(job):
+    await db.set_next_run(job.job_id, job.next_run)
+
+# Takroriy xabarlar uchun yagona rejalashtiruvchi
+scheduler = Scheduler(run_recurring_message, workers=SCHEDULER_WORKERS, on_reschedule=save_next_run)
+
+# Jarayon holati ko'rsatkichlari (/metrics so'ralganda hisoblanadi)
+metrics.gauge("scheduler_jobs", "Faol takroriy xabarlar").set_function(lambda: len(scheduler))
+metrics.gauge("tg_clients", "Ulangan Telegram klientlari").set_function(lambda: len(clients))
+metrics.gauge("login_clients", "Tugallanmagan login klientlari").set_function(lambda: len(login_clients))
+metrics.gauge("media_cache_bytes", "Media keshi hajmi").set_function(lambda: media_cache.size)
+metrics.gauge("user_cache_hits", "Foydalanuvchi keshidan olingan javoblar").set_function(lambda: user_cache.hits)
+metrics.gauge("user_cache_misses", "Foydalanuvchi keshida topilmaganlar").set_function(lambda: user_cache.misses)
 
-async def send_message_to_channels(user_id, phone, group_ids, message_text, media_file_id):
+async def send_message_to_channels(message_id, user_id, phone, group_ids, message_text, media_file_id):
     session_file = f"sessions/session_{user_id}_{phone}.session"
-    async with get_session_lock(session_file):
-        try:
-            client = TelegramClient(session_file, api_id=API_ID, api_hash=API_HASH, session=SQLiteSession(session_file, timeout=10))
-            await client.connect()
-            if not await client.is_user_authorized():
-                logger.error("Client avtorizatsiya qilinmagan")
-                await bot.send_message(user_id, "❌ Akkaunt avtorizatsiya qilinmagan.")
-                return
+    try:
+        results = await dispatcher.broadcast(session_file, user_id, phone, group_ids, message_text, media_file_id, message_id=message_id)
+        if results is None:
+            logger.error(f"{session_file} avtorizatsiya qilinmagan")
+            await pause_account(user_id, phone)
+            return
+    except Exception as e:
+        logger.error(f"Xabar yuborishda xato: {e}")
+        notifier.notify(user_id, message_id, type(e).__name__, f"❌ Xabar yuborishda xato: {e}")
 
-            for gid in group_ids:
-                try:
-                    entity = await client.get_input_entity(gid)
-                    if media_file_id:
-                        file_info = await bot.get_file(media_file_id)
-                        file_path = file_info.file_path
-                        downloaded_file = await bot.download_file(file_path)
-                        with open(f"temp_media_{gid}.jpg", "wb") as f:
-                            f.write(downloaded_file)
-                        await client.send_file(entity, f"temp_media_{gid}.jpg", caption=message_text)
-                        os.remove(f"temp_media_{gid}.jpg")
-                    else:
-                        await client.send_message(entity, message_text)
-                    logger.info(f"Xabar {gid} kanaliga {phone} orqali yuborildi")
-                except (ChannelInvalidError, ChannelPrivateError, PeerIdInvalidError) as e:
-                    logger.error(f"Kanal {gid} uchun xato: {e}")
-                    await bot.send_message(user_id, f"❌ Kanal {gid} ga xabar yuborishda xato: {e}")
-            await client.disconnect()
-        except Exception as e:
-            logger.error(f"Xabar yuborishda xato: {e}")
-            await bot.send_message(user_id, f"❌ Xabar yuborishda xato: {e}")
+# Avtorizatsiyadan chiqqan akkauntning takroriy xabarlari to'xtatiladi (har tick da xato yubormaslik uchun)
+async def pause_account(user_id, phone):
+    session_file = f"sessions/session_{user_id}_{phone}.session"
+    message_ids = await db.pause_account_messages(user_id, phone)
+    for message_id in message_ids:
+        scheduler.cancel(message_id)
+        worker_accounts.get(session_file, set()).discard(message_id)
+    await clients.discard(session_file)
+    notifier.notify(user_id, None, "unauthorized", f"❌ {phone} akkaunti avtorizatsiyadan chiqqan, {len(message_ids)} ta takroriy xabar "
+                                                   f"to‘xtatildi. Akkauntni qayta qo‘shsangiz yuborish davom etadi.")
+
+# Akkaunt qayta qo'shilganda to'xtatilgan xabarlar davom ettiriladi
+async def resume_account(user_id, phone):
+    now = time.time()
+    for message_id in await db.resume_account_messages(user_id, phone):
+        if SENDER_MODE == "external":
+            await db.add_message_event(message_id, "create")
+            continue
+        msg = await db.get_message(message_id)
+        if msg is not None:
+            restore_job(msg, now)
 
 # Admin paneli
+ADMIN_CALLBACKS = ["stats", "limits", "metrics", "bulk_import", "manage_users", "add_funds", "remove_funds"]
+
 @bot.message_handler(commands=['admin'])
 async def admin_panel(message):
     user_id = message.from_user.id
@@ -432,11 +578,14 @@ async def admin_panel(message):
     markup = InlineKeyboardMarkup()
     markup.add(
         InlineKeyboardButton("📊 Statistika", callback_data="stats"),
+        InlineKeyboardButton("⏱ Yuborish limitlari", callback_data="limits"),
+        InlineKeyboardButton("📈 Metrikalar", callback_data="metrics"),
+        InlineKeyboardButton("📥 Ommaviy import", callback_data="bulk_import"),
         InlineKeyboardButton("👤 Foydalanuvchilarni boshqarish", callback_data="manage_users")
     )
     await bot.send_message(message.chat.id, "Admin paneli:", reply_markup=markup)
 
-@bot.callback_query_handler(func=lambda call: call.data in ["stats", "manage_users", "add_funds", "remove_funds"])
+@bot.callback_query_handler(func=lambda call: call.data in ADMIN_CALLBACKS)
 async def admin_callbacks(call):
     user_id = call.from_user.id
     if user_id != ADMIN_USER_ID:
@@ -445,19 +594,34 @@ async def admin_callbacks(call):
 
     try:
         if call.data == "stats":
-            async with db_lock:
-                pool = await create_db_pool()
-                async with pool.acquire() as conn:
-                    async with conn.cursor() as c:
-                        await c.execute("SELECT COUNT(*) FROM users")
-                        user_count = (await c.fetchone())[0]
-                        await c.execute("SELECT COUNT(*) FROM accounts")
-                        account_count = (await c.fetchone())[0]
-                        await c.execute("SELECT COUNT(*) FROM messages")
-                        message_count = (await c.fetchone())[0]
-                pool.close()
-                await pool.wait_closed()
-            await bot.send_message(call.message.chat.id, f"📊 Statistika:\nFoydalanuvchilar: {user_count}\nAkkauntlar: {account_count}\nXabarlar: {message_count}")
+            (user_count, account_count, message_count), deliveries = await asyncio.gather(
+                db.get_stats(), db.get_delivery_stats(time.time() - 24 * 3600))
+            sent, sent_latency = deliveries.get(SENT, (0, 0))
+            failed, _ = deliveries.get(FAILED, (0, 0))
+            deferred, _ = deliveries.get(DEFERRED, (0, 0))
+            await bot.send_message(call.message.chat.id, f"📊 Statistika:\nFoydalanuvchilar: {user_count}\nAkkauntlar: {account_count}\nXabarlar: {message_count}\n\n"
+                                                         f"📨 Oxirgi 24 soat:\nYuborildi: {sent} (o‘rtacha {sent_latency} ms)\nXato: {failed}\nKeyinga qoldirildi: {deferred}")
+        elif call.data == "limits":
+            snapshot = sorted(send_limiter.snapshot(), key=lambda st: st["throttled"], reverse=True)
+            if not snapshot:
+                await bot.send_message(call.message.chat.id, "⏱ Hozircha yuborishlar bo‘lmagan.")
+                return
+            text = "⏱ Yuborish limitlari:\n"
+            for st in snapshot[:30]:
+                account = os.path.basename(st["account"])
+                text += (f"{account}: tezlik {st['rate']}/s, pauza {st['paused']} s, "
+                         f"kutilgan {st['throttled']} s, FloodWait {st['flood_waits']}, yuborilgan {st['sends']}\n")
+            await bot.send_message(call.message.chat.id, text)
+        elif call.data == "metrics":
+            summary = metrics.summary()
+            if not summary:
+                await bot.send_message(call.message.chat.id, "📈 Hozircha metrikalar yo‘q.")
+                return
+            await bot.send_message(call.message.chat.id, f"📈 Metrikalar:\n{summary}"[:4000])
+        elif call.data == "bulk_import":
+            await states.set(user_id, {"step": "bulk_import"})
+            await bot.send_message(call.message.chat.id, "📥 CSV yoki JSON hujjat yuboring. Ustunlar: user_id, phone, targets "
+                                                         "(guruh ID lari, vergul bilan), text, media (rasm file_id, ixtiyoriy), interval (minutda).")
         elif call.data == "manage_users":
             markup = InlineKeyboardMarkup()
             markup.add(
@@ -465,13 +629,13 @@ async def admin_callbacks(call):
                 InlineKeyboardButton("💸 Pul ayirish", callback_data="remove_funds")
             )
             await bot.send_message(call.message.chat.id, "Foydalanuvchi ID sini kiriting:", reply_markup=markup)
-            user_data[user_id] = {"step": "manage_user_id"}
+            await states.set(user_id, {"step": "manage_user_id"})
     except Exception as e:
         logger.error(f"Admin callback xatosi: {e}")
         await bot.send_message(call.message.chat.id, f"❌ Xato yuz berdi: {e}")
 
-@bot.message_handler(func=lambda message: user_data.get(message.from_user.id, {}).get("step") == "manage_user_id")
-async def manage_user_id(message):
+# handle_text_photo dan "manage_user_id" qadamida chaqiriladi
+async def manage_user_id(message, state):
     user_id = message.from_user.id
     if user_id != ADMIN_USER_ID:
         await bot.send_message(message.chat.id, "❌ Sizda admin huquqlari yo‘q.")
@@ -479,19 +643,13 @@ async def manage_user_id(message):
 
     try:
         target_user_id = int(message.text)
-        async with db_lock:
-            pool = await create_db_pool()
-            async with pool.acquire() as conn:
-                async with conn.cursor() as c:
-                    await c.execute("SELECT COUNT(*) FROM users WHERE user_id = %s", (target_user_id,))
-                    exists = (await c.fetchone())[0]
-            pool.close()
-            await pool.wait_closed()
+        exists = await db.user_exists(target_user_id)
         if not exists:
             await bot.send_message(message.chat.id, "❌ Bunday foydalanuvchi topilmadi.")
             return
-        user_data[user_id]["target_user_id"] = target_user_id
-        user_data[user_id]["step"] = "manage_funds"
+        state["target_user_id"] = target_user_id
+        state["step"] = "manage_funds"
+        await states.set(user_id, state)
         await bot.send_message(message.chat.id, "Qancha pul qo‘shish/ayirish (so‘mda)?")
     except ValueError:
         await bot.send_message(message.chat.id, "Iltimos, to‘g‘ri ID kiriting.")
@@ -499,8 +657,8 @@ async def manage_user_id(message):
         logger.error(f"Foydalanuvchi ID boshqaruv xatosi: {e}")
         await bot.send_message(message.chat.id, f"❌ Xato yuz berdi: {e}")
 
-@bot.message_handler(func=lambda message: user_data.get(message.from_user.id, {}).get("step") == "manage_funds")
-async def manage_funds(message):
+# handle_text_photo dan "manage_funds" qadamida chaqiriladi
+async def manage_funds(message, state):
     user_id = message.from_user.id
     if user_id != ADMIN_USER_ID:
         await bot.send_message(message.chat.id, "❌ Sizda admin huquqlari yo‘q.")
@@ -508,45 +666,277 @@ async def manage_funds(message):
 
     try:
         amount = int(message.text)
-        target_user_id = user_data[user_id]["target_user_id"]
-        async with db_lock:
-            pool = await create_db_pool()
-            async with pool.acquire() as conn:
-                async with conn.cursor() as c:
-                    await c.execute("UPDATE users SET balance = balance + %s WHERE user_id = %s", (amount, target_user_id))
-            pool.close()
-            await pool.wait_closed()
+        target_user_id = state["target_user_id"]
+        await db.change_balance(target_user_id, amount)
+        user_cache.invalidate(("balance", target_user_id))
         await bot.send_message(message.chat.id, f"Hisob o‘zgartirildi: {amount} so‘m")
-        user_data[user_id]["step"] = None
+        await states.delete(user_id)
     except ValueError:
         await bot.send_message(message.chat.id, "Iltimos, raqam kiriting.")
     except Exception as e:
         logger.error(f"Hisob boshqaruv xatosi: {e}")
         await bot.send_message(message.chat.id, f"❌ Xato yuz berdi: {e}")
 
-# Takroriy vazifalarni tiklash
+# Ommaviy import hujjati ("bulk_import" qadamida)
+@bot.message_handler(content_types=['document'])
+async def handle_document(message):
+    user_id = message.from_user.id
+    state = await states.get(user_id)
+    if state is None or state.get("step") != "bulk_import" or user_id != ADMIN_USER_ID:
+        return
+
+    document = message.document
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await bot.send_message(message.chat.id, f"❌ Hujjat juda katta (maksimal {IMPORT_MAX_FILE_SIZE // 1024} KB).")
+        return
+    try:
+        file_info = await bot.get_file(document.file_id)
+        data = await bot.download_file(file_info.file_path)
+        rows, errors = bulk_import.parse_document(document.file_name or "", data)
+    except ValueError as e:
+        await bot.send_message(message.chat.id, f"❌ Hujjatni o‘qib bo‘lmadi: {e}")
+        return
+    except Exception as e:
+        logger.error(f"Import hujjatini yuklashda xato: {e}")
+        await bot.send_message(message.chat.id, f"❌ Hujjatni yuklashda xato: {e}")
+        return
+    await states.delete(user_id)
+
+    await bot.send_message(message.chat.id, f"⏳ {len(rows)} ta qator tekshirilmoqda...")
+    try:
+        valid = await validate_import_rows(rows, errors)
+        await import_messages([row for _, row in valid])
+    except Exception as e:
+        logger.error(f"Ommaviy import xatosi: {e}")
+        await bot.send_message(message.chat.id, f"❌ Import bajarilmadi, hech qaysi xabar yaratilmadi: {e}")
+        return
+    logger.info(f"Ommaviy import: {len(valid)} ta xabar yaratildi, {len(errors)} ta qatorda xato")
+    await bot.send_message(message.chat.id, bulk_import.format_report(len(valid), errors))
+
+# Qatorlar akkaunt bo'yicha guruhlanadi; har akkauntning barcha guruh ID lari bitta prewarm bilan,
+# akkauntlar esa parallel (IMPORT_CONCURRENCY gacha) tekshiriladi. Xatolar errors ga qo'shiladi
+async def validate_import_rows(rows, errors):
+    by_account = {}
+    for number, row in rows:
+        if row["phone"] not in await get_accounts(row["user_id"]):
+            errors.append((number, f"{row['phone']} akkaunti foydalanuvchi {row['user_id']} da topilmadi"))
+            continue
+        session_file = f"sessions/session_{row['user_id']}_{row['phone']}.session"
+        by_account.setdefault(session_file, []).append((number, row))
+
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    valid = []
+
+    async def validate(session_file, account_rows):
+        async with semaphore:
+            try:
+                async with validation_client(session_file) as client:
+                    if client is None:
+                        errors.extend((number, "akkaunt avtorizatsiya qilinmagan") for number, _ in account_rows)
+                        return
+                    peer_ids = list(dict.fromkeys(gid for _, row in account_rows for gid in row["targets"]))
+                    failed = await entity_cache.prewarm(client, session_file, peer_ids, errors=RESOLVE_ERRORS)
+            except Exception as e:
+                logger.error(f"Importda {session_file} ni tekshirishda xato: {e}")
+                errors.extend((number, f"akkauntni tekshirishda xato: {e}") for number, _ in account_rows)
+                return
+        for number, row in account_rows:
+            invalid_ids = [gid for gid in row["targets"] if gid in failed]
+            if invalid_ids:
+                errors.append((number, f"noto‘g‘ri yoki kirish huquqi yo‘q ID lar: {invalid_ids}"))
+            else:
+                valid.append((number, row))
+
+    await asyncio.gather(*(validate(session_file, account_rows) for session_file, account_rows in by_account.items()))
+    return sorted(valid, key=lambda item: item[0])
+
+# Xabarlar bitta tranzaksiyada yoziladi va rejalashtiruvchiga birdaniga qo'shiladi.
+# Birinchi yuborishlar interval bo'ylab taqsimlanadi: yuzlab xabar bir vaqtda ishga tushmaydi
+async def import_messages(rows):
+    if not rows:
+        return []
+    now = int(time.time())
+    records = []
+    for index, row in enumerate(rows):
+        next_run_at = now + int((index * 0.6180339887) % 1 * row["interval"] * 60)
+        records.append((row["user_id"], row["phone"], row["targets"], row["text"], row["media"], row["interval"], next_run_at))
+    message_ids = await db.insert_messages(records)
+    if SENDER_MODE == "external":
+        await db.add_message_events(message_ids, "create")
+    else:
+        scheduler.add_many([(message_id, send_interval * 60, recurring_payload(user_id, phone, group_ids, message_text, media_file_id), next_run_at)
+                            for message_id, (user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at)
+                            in zip(message_ids, records)])
+    return message_ids
+
+# Muddati o'tgan xabarlarning birinchi yuborilishini interval bo'ylab taqsimlash
+def restore_first_run(message_id, send_interval, next_run_at, now):
+    if next_run_at is not None and next_run_at >= now:
+        return next_run_at
+    interval = send_interval * 60
+    if RESTORE_JITTER == "random":
+        offset = random.uniform(0, interval)
+    else:
+        offset = (message_id * 0.6180339887) % 1 * interval
+    return now + offset
+
+# Takroriy vazifalarni tiklash (bo'laklab o'qiladi, birdaniga hammasi yuborilmaydi)
 async def restore_recurring_tasks():
-    async with db_lock:
-        pool = await create_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as c:
-                await c.execute("SELECT message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval FROM messages WHERE is_recurring = 1")
-                messages = await c.fetchall()
-        pool.close()
-        await pool.wait_closed()
+    now = time.time()
+    restored = 0
+    try:
+        async for msg in db.iter_recurring_messages(RESTORE_CHUNK_SIZE):
+            restore_job(msg, now)
+            restored += 1
+    except Exception as e:
+        logger.error(f"Takroriy xabarlarni tiklashda xato ({restored} ta tiklandi): {e}")
+        return
+    logger.info(f"{restored} ta takroriy xabar tiklandi")
+
+# SIGINT/SIGTERM kelguncha kutish
+async def wait_for_shutdown():
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    await stop_event.wait()
+
+# Worker rejimi: akkauntlar ijarasi olinganda ularning xabarlari yuklanadi
+worker_accounts = {}
+coordinator = None
+
+async def load_account_jobs(session_file):
+    now = time.time()
+    for msg in await db.get_account_messages(session_file):
+        restore_job(msg, now)
+        worker_accounts.setdefault(session_file, set()).add(msg[0])
+
+async def drop_account_jobs(session_file):
+    for message_id in worker_accounts.pop(session_file, ()):
+        scheduler.cancel(message_id)
+    await clients.discard(session_file)
+
+async def apply_message_event(message_id, event):
+    if event == "cancel":
+        job = scheduler.get(message_id)
+        if job is not None:
+            session_file = f"sessions/session_{job.payload['user_id']}_{job.payload['phone']}.session"
+            worker_accounts.get(session_file, set()).discard(message_id)
+            scheduler.cancel(message_id)
+    elif event == "create":
+        msg = await db.get_message(message_id)
+        if msg is None:
+            return
+        message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at = msg
+        session_file = f"sessions/session_{user_id}_{phone}.session"
+        # Ijarasi yo'q akkauntlarning xabarlari keyingi rebalance da yuklanadi
+        if coordinator.owns(session_file):
+            add_recurring_job(message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval, next_run_at)
+            worker_accounts.setdefault(session_file, set()).add(message_id)
+
+async def run_worker(worker_id=None):
+    global coordinator
+    owner = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    coordinator = ShardCoordinator(db, owner, load_account_jobs, drop_account_jobs, apply_message_event,
+                                   lease_ttl=WORKER_LEASE_TTL, heartbeat=WORKER_HEARTBEAT, poll_interval=WORKER_EVENT_POLL)
+    await coordinator.start()
+    logger.info(f"Worker {owner} ishga tushdi, {len(coordinator.owned)} ta akkaunt olindi")
+    # Ijaralar shutdown() da, yuborishlar tugatilgandan keyin bo'shatiladi
+    await wait_for_shutdown()
+
+# Webhook rejimi: SIGINT/SIGTERM kelguncha ishlaydi
+async def run_webhook():
+    server = WebhookServer(bot, WEBHOOK_SECRET, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, workers=WEBHOOK_WORKERS)
+    await server.start()
+    if WEBHOOK_URL:
+        await bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+    try:
+        await wait_for_shutdown()
+    finally:
+        await server.stop()
 
-    for msg in messages:
-        message_id, user_id, phone, group_ids, message_text, media_file_id, send_interval = msg
-        group_ids = [int(gid) for gid in group_ids.split(",") if gid.strip()]
-        task = asyncio.create_task(run_recurring_message(user_id, message_id, phone, group_ids, message_text, media_file_id, send_interval))
-        recurring_tasks[(user_id, message_id)] = task
+# Polling rejimi: SIGINT/SIGTERM kelganda yangilanishlarni olish to'xtatiladi
+async def run_polling():
+    polling = asyncio.create_task(bot.polling())
+    try:
+        await wait_for_shutdown()
+    finally:
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+
+# To'xtash tartibi: yangi ishlar boshlanmaydi, bajarilayotgan yuborishlar SHUTDOWN_TIMEOUT ichida
+# tugatiladi, natijalar (message_targets checkpoint lari) yoziladi, shundan keyingina ijaralar
+# bo'shatiladi va ulanishlar yopiladi
+async def shutdown(background, metrics_server):
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await scheduler.stop(SHUTDOWN_TIMEOUT)
+    await delivery_log.stop()
+    if coordinator is not None:
+        await coordinator.stop()
+    await notifier.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await login_clients.close_all()
+    await clients.close_all()
+    if session_store is not None:
+        await session_store.close()
+    await db.close()
+    await bot.close_session()
 
 # Botni ishga tushirish
-async def main():
+async def main(mode="polling", worker_id=None, profile=False):
+    if mode == "webhook" and not WEBHOOK_SECRET:
+        raise SystemExit("Webhook rejimi uchun WEBHOOK_SECRET ni .env da ko'rsating")
+    profiler = None
+    if profile:
+        profiler = Profiler(PROFILE_TRACE_PATH, max_bytes=PROFILE_TRACE_MAX_BYTES, backups=PROFILE_TRACE_BACKUPS,
+                            lag_interval=PROFILE_LAG_INTERVAL, slow_callback=PROFILE_SLOW_CALLBACK)
+        profiler.wrap_bot(bot)
+        scheduler.handler = profiler.wrap("job:run_recurring_message", scheduler.handler)
+        await profiler.start()
     await init_db()
-    await restore_recurring_tasks()
-    print("🚀 Bot ishga tushdi")
-    await bot.polling()
+    # Bot va worker lar bir xostda ishlaydi: worker lar METRICS_PORT ni egallamaydi, band port jarayonni to'xtatmaydi
+    metrics_port = WORKER_METRICS_PORT if mode == "worker" else METRICS_PORT
+    metrics_server = MetricsServer(metrics, host=METRICS_HOST, port=metrics_port) if metrics_port else None
+    if metrics_server is not None:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.error(f"/metrics {METRICS_HOST}:{metrics_port} da ochilmadi: {e}")
+            await metrics_server.stop()
+            metrics_server = None
+    warmup.start()
+    delivery_log.start()
+    scheduler.start()
+    janitors = [
+        asyncio.create_task(clients.run_janitor()),
+        asyncio.create_task(login_clients.run_janitor()),
+        asyncio.create_task(run_state_cleanup(states)),
+        asyncio.create_task(notifier.run_janitor()),
+    ]
+    # Tiklash fonda bajariladi: bot darhol javob bera boshlaydi.
+    # external rejimda bot faqat bazaga yozadi, yuborishni worker lar bajaradi
+    if mode != "worker" and SENDER_MODE != "external":
+        janitors.append(asyncio.create_task(restore_recurring_tasks()))
+    print(f"🚀 Bot ishga tushdi ({mode})")
+    try:
+        if mode == "webhook":
+            await run_webhook()
+        elif mode == "worker":
+            await run_worker(worker_id)
+        else:
+            await run_polling()
+    finally:
+        await shutdown(janitors, metrics_server)
+        if profiler is not None:
+            await profiler.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["polling", "webhook", "worker"], default="polling")
+    parser.add_argument("--worker-id", help="worker nomi (standart: host:pid)")
+    parser.add_argument("--profile", action="store_true", help="handler/ish davomiyligi va event loop kechikishini PROFILE_TRACE_PATH ga yozish")
+    args = parser.parse_args()
+    asyncio.run(main(args.mode, args.worker_id, args.profile))
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from telethon.errors import FilePartMissingError, FilePart0MissingError, FilePartsInvalidError
+from metrics import registry, timed
+
+logger = logging.getLogger(__name__)
+
+# Yuklangan fayl Telegram serverida muddati o'tgan bo'lsa keladigan xatolar
+UPLOAD_EXPIRED_ERRORS = (FilePartMissingError, FilePart0MissingError, FilePartsInvalidError)
+
+DOWNLOAD_SECONDS = registry.histogram("bot_download_seconds", "Bot API dan fayl yuklab olish davomiyligi")
+UPLOAD_SECONDS = registry.histogram("tg_upload_seconds", "Telethon ga fayl yuklash davomiyligi")
+
+
+# Bot API dan yuklab olingan media fayllar keshi (file_id bo'yicha, umumiy hajmi cheklangan LRU).
+# Har bir akkaunt uchun Telethon ga yuklangan fayl handle lari ham saqlanadi,
+# shunda bitta rasm har bir guruhga qayta yuklanmaydi.
+class MediaCache:
+    def __init__(self, bot, max_bytes=64 * 1024 * 1024, upload_ttl=3600, max_uploads=1024):
+        self.bot = bot
+        self.max_bytes = max_bytes
+        self.upload_ttl = upload_ttl
+        self.max_uploads = max_uploads
+        self._files = OrderedDict()
+        self._size = 0
+        self._downloads = {}
+        self._uploads = OrderedDict()
+        self._upload_locks = {}
+
+    # file_id bo'yicha fayl baytlarini qaytaradi, bir vaqtdagi so'rovlar bitta yuklashni kutadi
+    async def get_bytes(self, file_id):
+        data = self._files.get(file_id)
+        if data is not None:
+            self._files.move_to_end(file_id)
+            return data
+        future = self._downloads.get(file_id)
+        if future is None:
+            future = asyncio.ensure_future(self._download(file_id))
+            self._downloads[file_id] = future
+            future.add_done_callback(lambda _: self._downloads.pop(file_id, None))
+        return await asyncio.shield(future)
+
+    @timed(DOWNLOAD_SECONDS)
+    async def _download(self, file_id):
+        file_info = await self.bot.get_file(file_id)
+        data = await self.bot.download_file(file_info.file_path)
+        self._store(file_id, data)
+        return data
+
+    def _store(self, file_id, data):
+        if len(data) > self.max_bytes:
+            return
+        self._files[file_id] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, old = self._files.popitem(last=False)
+            self._size -= len(old)
+
+    # Akkaunt uchun yuklangan fayl handle ini qaytaradi (kerak bo'lsa yuklaydi)
+    async def get_upload(self, client, account, file_id):
+        key = (account, file_id)
+        if key not in self._upload_locks:
+            self._upload_locks[key] = asyncio.Lock()
+        async with self._upload_locks[key]:
+            cached = self._uploads.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.upload_ttl:
+                self._uploads.move_to_end(key)
+                return cached[0]
+            data = await self.get_bytes(file_id)
+            with UPLOAD_SECONDS.time():
+                handle = await client.upload_file(data, file_name="photo.jpg")
+            self._uploads[key] = (handle, time.monotonic())
+            self._uploads.move_to_end(key)
+            while len(self._uploads) > self.max_uploads:
+                old_key, _ = self._uploads.popitem(last=False)
+                self._upload_locks.pop(old_key, None)
+            return handle
+
+    def invalidate_upload(self, account, file_id):
+        self._uploads.pop((account, file_id), None)
+
+    # Rasmni keshdan yuborish; handle muddati o'tgan bo'lsa bir marta qayta yuklanadi
+    async def send_photo(self, client, account, entity, file_id, caption):
+        handle = await self.get_upload(client, account, file_id)
+        try:
+            return await client.send_file(entity, handle, caption=caption)
+        except UPLOAD_EXPIRED_ERRORS as e:
+            logger.info(f"Yuklangan fayl eskirgan ({account}, {file_id}): {e}, qayta yuklanmoqda")
+            self.invalidate_upload(account, file_id)
+            handle = await self.get_upload(client, account, file_id)
+            return await client.send_file(entity, handle, caption=caption)
+
+    @property
+    def size(self):
+        return self._size
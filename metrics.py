@@ -0,0 +1,216 @@
+import bisect
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Sekunddagi vaqtlar uchun standart chegaralar (Telegram so'rovlari ~10 ms dan bir necha minutgacha)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, value=1, **labels):
+        key = _key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def collect(self):
+        for key, value in self._values.items():
+            yield self.name, key, value
+
+
+# Qiymati qo'lda o'rnatiladigan yoki har safar funksiyadan olinadigan (set_function) ko'rsatkich
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name, help):
+        super().__init__(name, help)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        self._values[_key(labels)] = value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+    def set_function(self, function, **labels):
+        self._functions[_key(labels)] = function
+
+    def collect(self):
+        yield from super().collect()
+        for key, function in self._functions.items():
+            try:
+                yield self.name, key, function()
+            except Exception as e:
+                logger.error(f"{self.name} ko'rsatkichini hisoblashda xato: {e}")
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = _HistogramValue(len(self.buckets) + 1)
+        entry.counts[bisect.bisect_left(self.buckets, value)] += 1
+        entry.sum += value
+        entry.count += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    # Bucket lar bo'yicha taxminiy kvantil (bucket yuqori chegarasi)
+    def quantile(self, q, **labels):
+        entry = self._values.get(_key(labels))
+        if entry is None or not entry.count:
+            return 0.0
+        rank = q * entry.count
+        seen = 0
+        for bound, count in zip(self.buckets, entry.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def items(self):
+        return [(dict(key), entry.count, entry.sum) for key, entry in self._values.items()]
+
+    def collect(self):
+        for key, entry in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", bound),), cumulative
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), entry.count
+            yield f"{self.name}_sum", key, entry.sum
+            yield f"{self.name}_count", key, entry.count
+
+
+# Jarayon ichidagi barcha ko'rsatkichlar; /metrics uchun Prometheus matn formatida chiqaradi
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _get(self, cls, name, help, *args):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help, *args)
+        return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=""):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.collect():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Admin paneli uchun: umumiy vaqt bo'yicha eng og'ir bosqichlar
+    def summary(self, limit=15):
+        rows = []
+        for metric in self._metrics.values():
+            if isinstance(metric, Histogram):
+                for labels, count, total in metric.items():
+                    rows.append((total, metric, labels, count))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        lines = []
+        for total, metric, labels, count in rows[:limit]:
+            label = ",".join(str(value) for value in labels.values())
+            name = f"{metric.name}[{label}]" if label else metric.name
+            lines.append(f"{name}: {count} ta, o'rtacha {total / count * 1000:.0f} ms, "
+                         f"p99 ≤{metric.quantile(0.99, **labels) * 1000:.0f} ms, jami {total:.1f} s")
+        for metric in self._metrics.values():
+            if isinstance(metric, Counter):
+                for name, key, value in metric.collect():
+                    lines.append(f"{name}{_format_labels(key)}: {value}")
+        return "\n".join(lines)
+
+
+registry = Registry()
+
+
+# Korutina bajarilish vaqtini gistogrammaga yozadigan dekorator
+def timed(histogram, **labels):
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Mahalliy /metrics HTTP endpoint
+class MetricsServer:
+    def __init__(self, registry, host="127.0.0.1", port=9100, path="/metrics"):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def handle(self, request):
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(self.path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrikalar http://{self.host}:{self.port}{self.path} da")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("count", "detail", "peers")
+
+    def __init__(self, detail):
+        self.count = 0
+        self.detail = detail
+        self.peers = []
+
+
+# Foydalanuvchilarga xato xabarnomalari: (user, message_id, xato turi) bo'yicha birlashtiriladi,
+# oyna (window) tugagach bitta umumiy xabar yuboriladi. Bir xil xato repeat_after ichida
+# qayta xabar qilinmaydi (faqat sanaladi). Bot API ga yuborish chat bo'yicha va global cheklanadi,
+# global limit UI javoblari bilan umumiy bo'lgani uchun undan pastroq qo'yiladi.
+class Notifier:
+    def __init__(self, bot, window=60, repeat_after=3600, chat_rate=1 / 3, global_rate=10, max_users=10000):
+        self.bot = bot
+        self.window = window
+        self.repeat_after = repeat_after
+        self.chat_rate = chat_rate
+        self.max_users = max_users
+        self._global = TokenBucket(global_rate)
+        self._chats = {}
+        self._pending = {}
+        self._reported = {}
+        self._tasks = {}
+        self.dropped = 0
+
+    def notify(self, user_id, message_id, kind, detail, peer=None):
+        key = (message_id, kind)
+        pending = self._pending.get(user_id)
+        if pending is None:
+            if len(self._pending) >= self.max_users:
+                self.dropped += 1
+                return
+            pending = self._pending[user_id] = {}
+        entry = pending.get(key)
+        if entry is None:
+            entry = pending[key] = _Pending(detail)
+        entry.count += 1
+        if peer is not None and len(entry.peers) < 5 and peer not in entry.peers:
+            entry.peers.append(peer)
+        if user_id not in self._tasks and self._is_due(user_id, key):
+            self._tasks[user_id] = asyncio.create_task(self._flush_later(user_id))
+
+    def _is_due(self, user_id, key):
+        reported = self._reported.get((user_id,) + key)
+        return reported is None or time.monotonic() - reported >= self.repeat_after
+
+    async def _flush_later(self, user_id):
+        try:
+            await asyncio.sleep(self.window)
+            await self.flush(user_id)
+        finally:
+            self._tasks.pop(user_id, None)
+
+    # Yuborish vaqti kelgan xatolarni bitta xabarda yuborish; qolganlari sanalishda davom etadi
+    async def flush(self, user_id):
+        pending = self._pending.get(user_id, {})
+        due = [(key, entry) for key, entry in pending.items() if self._is_due(user_id, key)]
+        if not due:
+            return
+        now = time.monotonic()
+        lines = []
+        for key, entry in due:
+            del pending[key]
+            self._reported[(user_id,) + key] = now
+            message_id, kind = key
+            where = f"Xabar #{message_id}" if message_id is not None else "Akkaunt"
+            peers = f" (guruhlar: {', '.join(str(peer) for peer in entry.peers)})" if entry.peers else ""
+            times = f" ×{entry.count}" if entry.count > 1 else ""
+            lines.append(f"• {where}: {entry.detail}{times}{peers}")
+        if not pending:
+            self._pending.pop(user_id, None)
+        await self._send(user_id, "⚠️ Yuborishdagi xatolar:\n" + "\n".join(lines))
+
+    async def _send(self, user_id, text):
+        bucket = self._chats.get(user_id)
+        if bucket is None:
+            bucket = self._chats[user_id] = TokenBucket(self.chat_rate, 1)
+        await bucket.acquire()
+        await self._global.acquire()
+        try:
+            await self.bot.send_message(user_id, text[:4000])
+        except Exception as e:
+            logger.error(f"Foydalanuvchi {user_id} ga xabarnoma yuborilmadi: {e}")
+
+    # Eskirgan yozuvlarni tozalash (xotira chegaralangan bo'lishi uchun)
+    def cleanup(self):
+        now = time.monotonic()
+        self._reported = {key: reported for key, reported in self._reported.items() if now - reported < self.repeat_after}
+        self._chats = {user_id: bucket for user_id, bucket in self._chats.items() if user_id in self._pending}
+
+    async def run_janitor(self, interval=300):
+        while True:
+            await asyncio.sleep(interval)
+            self.cleanup()
+            # repeat_after tugagan, lekin yangi xato kelmagan yozuvlar ham yuboriladi
+            for user_id in list(self._pending):
+                if user_id not in self._tasks and any(self._is_due(user_id, key) for key in self._pending[user_id]):
+                    self._tasks[user_id] = asyncio.create_task(self._flush_later(user_id))
+
+    # To'xtashda kutilayotgan xabarnomalar darhol yuboriladi
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for user_id in list(self._pending):
+            await self.flush(user_id)
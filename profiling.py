@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import functools
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SPAN_SECONDS = registry.histogram("profile_span_seconds", "Handler va rejalashtirilgan ishlar davomiyligi (--profile)")
+LOOP_LAG_SECONDS = registry.histogram("event_loop_lag_seconds", "Event loop kechikishi (--profile)")
+SLOW_CALLBACKS = registry.counter("event_loop_slow_callbacks_total", "slow_callback_duration dan uzoq bajarilgan callback lar (--profile)")
+
+
+class _SlowCallbackHandler(logging.Handler):
+    def __init__(self, profiler):
+        super().__init__(logging.WARNING)
+        self.profiler = profiler
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Executing "):
+            SLOW_CALLBACKS.inc()
+            self.profiler.event("slow_callback", message=message)
+
+
+# Profil rejimi (--profile): span lar (handler/ish davomiyligi), event loop kechikishi va loop ni
+# to'sib qo'ygan kod steki aylanma trace fayliga JSON qatorlar sifatida yoziladi.
+# Faylga yozish alohida oqimda (QueueListener) bajariladi, loop ning o'zi to'silmaydi.
+# Loop slow_callback_duration dan uzoq band bo'lsa, watchdog oqimi asosiy oqim stekini yozib oladi.
+class Profiler:
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, lag_interval=0.1, slow_callback=0.1):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lag_interval = lag_interval
+        self.slow_callback = slow_callback
+        self._queue = queue.SimpleQueue()
+        self._listener = None
+        self._lag_task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread = None
+        self._slow_handler = _SlowCallbackHandler(self)
+
+    def event(self, kind, **fields):
+        fields["type"] = kind
+        fields["ts"] = round(time.time(), 3)
+        self._queue.put(fields)
+
+    # Korutinani span bilan o'rash (bot handlerlari va Scheduler.handler uchun)
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            error = None
+            try:
+                return await function(*args, **kwargs)
+            except BaseException as e:
+                error = type(e).__name__
+                raise
+            finally:
+                seconds = time.perf_counter() - started
+                SPAN_SECONDS.observe(seconds, name=name)
+                if error is None:
+                    self.event("span", name=name, ms=round(seconds * 1000, 3))
+                else:
+                    self.event("span", name=name, ms=round(seconds * 1000, 3), error=error)
+        return wrapper
+
+    # AsyncTeleBot ning barcha message/callback_query handlerlarini o'rash
+    def wrap_bot(self, bot):
+        for kind, handlers in (("message", bot.message_handlers), ("callback", bot.callback_query_handlers)):
+            for handler in handlers:
+                function = handler["function"]
+                handler["function"] = self.wrap(f"{kind}:{function.__name__}", function)
+
+    async def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups)
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = _TraceListener(self._queue, file_handler)
+        self._listener.start()
+
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.slow_callback
+        # Debug rejimidagi boshqa ogohlantirishlar (yopilmagan resurslar va h.k.) ham asyncio logger ida qoladi
+        logging.getLogger("asyncio").addHandler(self._slow_handler)
+
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._lag_task = asyncio.create_task(self._sample_lag())
+        self._watchdog = threading.Thread(target=self._watch, name="profile-watchdog", daemon=True)
+        self._watchdog.start()
+        self.event("start", pid=os.getpid(), lag_interval=self.lag_interval, slow_callback=self.slow_callback)
+        logger.info(f"Profil rejimi yoqildi: {self.path}")
+
+    async def _sample_lag(self):
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            LOOP_LAG_SECONDS.observe(lag)
+            self.event("lag", ms=round(lag * 1000, 3))
+
+    # Loop heartbeat yangilanmay qolsa, asosiy oqim steki bir marta (har to'xtab qolish uchun) yoziladi
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.slow_callback / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.lag_interval
+            if blocked < self.slow_callback or reported == heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            reported = heartbeat
+            self.event("stall", ms=round(blocked * 1000, 3), stack="".join(traceback.format_stack(frame)))
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+        self._stopped.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+        logging.getLogger("asyncio").removeHandler(self._slow_handler)
+        self.event("stop")
+        if self._listener is not None:
+            self._listener.stop()
+
+
+class _TraceListener(logging.handlers.QueueListener):
+    def dequeue(self, block):
+        fields = self.queue.get(block)
+        if fields is self._sentinel:
+            return fields
+        return logging.makeLogRecord({"msg": json.dumps(fields, ensure_ascii=False), "levelno": logging.INFO})
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+# Mavjud trace fayllari, eskisidan yangisiga: path.N, ..., path.1, path
+def trace_files(path):
+    backups = [name for name in glob.glob(glob.escape(path) + ".*") if name.rsplit(".", 1)[1].isdigit()]
+    backups.sort(key=lambda name: int(name.rsplit(".", 1)[1]), reverse=True)
+    return [name for name in backups + [path] if os.path.isfile(name)]
+
+
+# Aylanma trace fayllarining yozuvlari, eskisidan yangisiga
+def read_trace(path):
+    for name in trace_files(path):
+        with open(name) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+# Trace ni bench.compare solishtira oladigan tekis lug'atga aylantirish
+def summarize_trace(path):
+    spans = {}
+    lags = []
+    slow_callbacks = 0
+    stalls = []
+    for record in read_trace(path):
+        kind = record.get("type")
+        if kind == "span":
+            spans.setdefault(record["name"], []).append(record["ms"])
+        elif kind == "lag":
+            lags.append(record["ms"])
+        elif kind == "slow_callback":
+            slow_callbacks += 1
+        elif kind == "stall":
+            stalls.append(record["ms"])
+    result = {
+        "loop_lag_p50_ms": round(_percentile(lags, 50), 2),
+        "loop_lag_p99_ms": round(_percentile(lags, 99), 2),
+        "loop_lag_max_ms": round(max(lags, default=0.0), 2),
+        "slow_callbacks": slow_callbacks,
+        "stalls": len(stalls),
+        "stall_max_ms": round(max(stalls, default=0.0), 2),
+    }
+    for name, values in sorted(spans.items()):
+        result[f"span:{name}:count"] = len(values)
+        result[f"span:{name}:p50_ms"] = round(_percentile(values, 50), 2)
+        result[f"span:{name}:p99_ms"] = round(_percentile(values, 99), 2)
+    return result
+
+
+# Trace faylini ko'rish: python -m profiling trace.jsonl
+def main():
+    parser = argparse.ArgumentParser(description="Profil trace faylining qisqacha natijasi")
+    parser.add_argument("path")
+    parser.add_argument("--stacks", type=int, default=5, help="ko'rsatiladigan eng uzun to'xtab qolishlar soni")
+    args = parser.parse_args()
+    print(json.dumps(summarize_trace(args.path), indent=2, ensure_ascii=False))
+    stalls = [record for record in read_trace(args.path) if record.get("type") == "stall"]
+    for record in sorted(stalls, key=lambda record: record["ms"], reverse=True)[:args.stacks]:
+        print(f"\n--- Loop {record['ms']} ms to'silgan ---\n{record['stack']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+# Oddiy token bucket: sekundiga `rate` ta token, eng ko'pi `capacity` ta yig'iladi
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Token bo'lsa darhol oladi, aks holda qancha kutish kerakligini qaytaradi
+    def try_acquire(self, tokens=1):
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                wait = self.try_acquire(tokens)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+
+# Qayta ishga tushgandan keyingi "isinish" davri: shu vaqt ichida ulanishlar va
+# yuborishlar soni global cheklanadi, keyin cheklov o'z-o'zidan o'chadi
+class WarmupLimiter:
+    def __init__(self, duration, connects_per_second, sends_per_second):
+        self.duration = duration
+        self.connects = TokenBucket(connects_per_second)
+        self.sends = TokenBucket(sends_per_second)
+        self.until = 0.0
+
+    def start(self):
+        self.until = time.monotonic() + self.duration
+
+    @property
+    def active(self):
+        return time.monotonic() < self.until
+
+    async def acquire_connect(self):
+        if self.active:
+            await self.connects.acquire()
+
+    async def acquire_send(self):
+        if self.active:
+            await self.sends.acquire()
+
+
+class _AccountState:
+    __slots__ = ("bucket", "base_rate", "paused_until", "throttled", "flood_waits", "sends")
+
+    def __init__(self, rate, burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.base_rate = rate
+        self.paused_until = 0.0
+        self.throttled = 0.0
+        self.flood_waits = 0
+        self.sends = 0
+
+
+# Akkaunt va qabul qiluvchi (guruh/kanal) bo'yicha yuborish cheklovchisi.
+# FloodWait kelganda faqat shu akkaunt to'xtatiladi va uning tezligi kamaytiriladi (AIMD),
+# muvaffaqiyatli yuborishlardan keyin tezlik asta-sekin asl qiymatiga qaytadi.
+class SendLimiter:
+    def __init__(self, account_rate=1.0, account_burst=3, peer_rate=0.2, peer_burst=1,
+                 min_rate=0.05, recovery_step=0.01, max_peers=10000):
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.peer_rate = peer_rate
+        self.peer_burst = peer_burst
+        self.min_rate = min_rate
+        self.recovery_step = recovery_step
+        self.max_peers = max_peers
+        self._accounts = {}
+        self._peers = OrderedDict()
+        self._peer_paused = {}
+
+    def _account(self, account):
+        state = self._accounts.get(account)
+        if state is None:
+            state = self._accounts[account] = _AccountState(self.account_rate, self.account_burst)
+        return state
+
+    def _peer(self, account, peer):
+        key = (account, peer)
+        bucket = self._peers.get(key)
+        if bucket is None:
+            bucket = self._peers[key] = TokenBucket(self.peer_rate, self.peer_burst)
+            while len(self._peers) > self.max_peers:
+                old_key, _ = self._peers.popitem(last=False)
+                self._peer_paused.pop(old_key, None)
+        else:
+            self._peers.move_to_end(key)
+        return bucket
+
+    # Yuborishdan oldin chaqiriladi: pauza tugashini va ikkala bucket dan token kutadi
+    async def acquire(self, account, peer):
+        state = self._account(account)
+        started = time.monotonic()
+        while True:
+            now = time.monotonic()
+            pause = max(state.paused_until, self._peer_paused.get((account, peer), 0.0)) - now
+            if pause <= 0:
+                break
+            await asyncio.sleep(pause)
+        await state.bucket.acquire()
+        await self._peer(account, peer).acquire()
+        state.throttled += time.monotonic() - started
+
+    def paused_for(self, account):
+        state = self._accounts.get(account)
+        if state is None:
+            return 0.0
+        return max(0.0, state.paused_until - time.monotonic())
+
+    def on_success(self, account):
+        state = self._account(account)
+        state.sends += 1
+        bucket = state.bucket
+        if bucket.rate < state.base_rate:
+            bucket.rate = min(state.base_rate, bucket.rate + self.recovery_step)
+
+    def on_flood_wait(self, account, seconds):
+        state = self._account(account)
+        state.flood_waits += 1
+        state.paused_until = max(state.paused_until, time.monotonic() + seconds)
+        state.bucket.rate = max(self.min_rate, state.bucket.rate / 2)
+
+    # Slow mode faqat bitta guruhga taalluqli
+    def on_peer_wait(self, account, peer, seconds):
+        self._peer_paused[(account, peer)] = time.monotonic() + seconds
+
+    def snapshot(self):
+        now = time.monotonic()
+        return [
+            {
+                "account": account,
+                "rate": round(state.bucket.rate, 3),
+                "paused": round(max(0.0, state.paused_until - now), 1),
+                "throttled": round(state.throttled, 1),
+                "flood_waits": state.flood_waits,
+                "sends": state.sends,
+            }
+            for account, state in self._accounts.items()
+        ]
@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DRIFT_SECONDS = registry.histogram("scheduler_drift_seconds", "Rejalashtirilgan vaqtdan kechikish")
+JOB_SECONDS = registry.histogram("scheduler_job_seconds", "Rejalashtirilgan ishni bajarish davomiyligi")
+
+
+class Job:
+    __slots__ = ("job_id", "interval", "next_run", "payload", "version")
+
+    def __init__(self, job_id, interval, next_run, payload):
+        self.job_id = job_id
+        self.interval = interval
+        self.next_run = next_run
+        self.payload = payload
+        self.version = 0
+
+
+# Takroriy xabarlar uchun yagona rejalashtiruvchi: navbatdagi ishga tushish vaqtlari
+# heap da saqlanadi, muddati kelgan ishlar cheklangan sonli worker lar tomonidan bajariladi.
+# add / cancel / reschedule - O(log n); bekor qilingan yozuvlar heap dan dangasa o'chiriladi.
+class Scheduler:
+    def __init__(self, handler, workers=16, on_reschedule=None):
+        self.handler = handler
+        self.workers = workers
+        self.on_reschedule = on_reschedule
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._queue = asyncio.Queue(maxsize=workers)
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    def _push(self, job):
+        job.version += 1
+        heapq.heappush(self._heap, (job.next_run, next(self._seq), job.job_id, job.version))
+        if self._heap[0][2] == job.job_id:
+            self._wakeup.set()
+
+    def add(self, job_id, interval, payload, next_run=None):
+        if job_id in self._jobs:
+            self.cancel(job_id)
+        job = Job(job_id, interval, next_run if next_run is not None else time.time(), payload)
+        self._jobs[job_id] = job
+        self._push(job)
+        return job
+
+    # Ko'p ishni birdaniga qo'shish: jobs - (job_id, interval, payload, next_run); heap bir marta quriladi
+    def add_many(self, jobs):
+        for job_id, interval, payload, next_run in jobs:
+            if job_id in self._jobs:
+                self.cancel(job_id)
+            job = Job(job_id, interval, next_run if next_run is not None else time.time(), payload)
+            job.version += 1
+            self._jobs[job_id] = job
+            self._heap.append((job.next_run, next(self._seq), job.job_id, job.version))
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def cancel(self, job_id):
+        job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job.version += 1
+        return job is not None
+
+    def reschedule(self, job_id, next_run=None, interval=None):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        if interval is not None:
+            job.interval = interval
+        job.next_run = next_run if next_run is not None else time.time() + job.interval
+        self._push(job)
+        return True
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _is_current(self, entry):
+        job = self._jobs.get(entry[2])
+        return job is not None and job.version == entry[3]
+
+    async def _dispatch(self):
+        while True:
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            entry = heapq.heappop(self._heap)
+            job = self._jobs[entry[2]]
+            # Bajarilayotgan ish heap da bo'lmaydi, shuning uchun ikki marta ishga tushmaydi
+            job.version += 1
+            await self._queue.put(job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            # task_done() ish va uning keyingi vaqti saqlangandan keyin: stop() dagi join() shuni kutadi
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        DRIFT_SECONDS.observe(max(0.0, time.time() - job.next_run))
+        try:
+            with JOB_SECONDS.time():
+                await self.handler(job)
+        except Exception as e:
+            logger.error(f"Rejalashtirilgan ish {job.job_id} da xato: {e}")
+        if self._jobs.get(job.job_id) is not job:
+            return
+        # Jadval saqlanadi: o'tkazib yuborilgan ishga tushishlar yig'ilib qolmaydi
+        now = time.time()
+        next_run = job.next_run + job.interval
+        if next_run <= now:
+            next_run = now + job.interval
+        job.next_run = next_run
+        self._push(job)
+        if self.on_reschedule is not None:
+            try:
+                await self.on_reschedule(job)
+            except Exception as e:
+                logger.error(f"Ish {job.job_id} vaqtini saqlashda xato: {e}")
+
+    def start(self):
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._dispatch()))
+            for _ in range(self.workers):
+                self._tasks.append(asyncio.create_task(self._worker()))
+
+    # Yangi ishlar boshlanmaydi, navbatda kutayotganlari heap ga qaytariladi, bajarilayotganlari
+    # timeout ichida tugashi kutiladi (keyingi vaqti on_reschedule orqali saqlanadi), keyin bekor qilinadi
+    async def stop(self, timeout=0):
+        if not self._tasks:
+            return
+        dispatcher, workers = self._tasks[0], self._tasks[1:]
+        dispatcher.cancel()
+        await asyncio.gather(dispatcher, return_exceptions=True)
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            self._queue.task_done()
+            if self._jobs.get(job.job_id) is job:
+                self._push(job)
+        if timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Bajarilayotgan ishlar {timeout} s ichida tugamadi, bekor qilinmoqda")
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._tasks = []
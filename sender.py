@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import random
+import time
+from telethon.errors import (ChannelInvalidError, ChannelPrivateError, PeerIdInvalidError, FloodWaitError,
+                             SlowModeWaitError, ServerError, TimedOutError, RpcCallFailError, UnauthorizedError,
+                             AuthKeyDuplicatedError)
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Qayta urinib ko'rsa bo'ladigan vaqtinchalik xatolar
+RETRYABLE_ERRORS = (ConnectionError, asyncio.TimeoutError, ServerError, TimedOutError, RpcCallFailError)
+# Guruhning o'ziga tegishli, qayta urinish befoyda bo'lgan xatolar
+PEER_ERRORS = (ChannelInvalidError, ChannelPrivateError, PeerIdInvalidError)
+# Akkauntning o'ziga tegishli xatolar (sessiya bekor qilingan, akkaunt bloklangan va h.k.):
+# ulangan klientda is_user_authorized() keshlangani uchun ular faqat yuborishda ko'rinadi
+ACCOUNT_ERRORS = (UnauthorizedError, AuthKeyDuplicatedError)
+
+
+# Bitta guruhga yetkazish (qayta urinishlar bilan) va uning bosqichlari
+DELIVER_SECONDS = registry.histogram("send_deliver_seconds", "Guruhga yetkazish davomiyligi (natija bo'yicha)")
+STAGE_SECONDS = registry.histogram("send_stage_seconds", "Yuborish bosqichlari: resolve, limit kutish, yuborish")
+FLOOD_WAITS = registry.counter("send_flood_waits_total", "FloodWait xatolari")
+
+
+class AccountDeferred(Exception):
+    pass
+
+
+# Yuborish natijalari
+SENT = "sent"
+FAILED = "failed"
+DEFERRED = "deferred"
+
+
+# Xabarlarni guruhlarga tarqatish: akkauntlar parallel ishlaydi (global cheklov bilan),
+# bitta akkaunt ichida ham bir nechta guruhga bir vaqtda yuboriladi (akkaunt cheklovi va
+# SendLimiter ruxsat bergan darajada). Xato bergan guruh qolganlarini to'xtatmaydi.
+class Dispatcher:
+    def __init__(self, clients, limiter, media_cache, warmup=None, entity_cache=None, global_concurrency=32, account_concurrency=2,
+                 resolve_concurrency=4, max_retries=3, retry_base=2.0, max_flood_sleep=60, on_error=None,
+                 delivery_log=None):
+        self.clients = clients
+        self.limiter = limiter
+        self.media_cache = media_cache
+        self.warmup = warmup
+        self.entity_cache = entity_cache
+        self.account_concurrency = account_concurrency
+        self.resolve_concurrency = resolve_concurrency
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.max_flood_sleep = max_flood_sleep
+        # on_error(user_id, message_id, gid, error) - foydalanuvchini xabardor qilish uchun korutina
+        self.on_error = on_error
+        self.delivery_log = delivery_log
+        self._global = asyncio.Semaphore(global_concurrency)
+        self._accounts = {}
+        self._resolving = {}
+        self._revoked = set()
+
+    def _account_semaphore(self, account):
+        if account not in self._accounts:
+            self._accounts[account] = asyncio.Semaphore(self.account_concurrency)
+        return self._accounts[account]
+
+    def _resolve_semaphore(self, account):
+        if account not in self._resolving:
+            self._resolving[account] = asyncio.Semaphore(self.resolve_concurrency)
+        return self._resolving[account]
+
+    # Bitta akkauntdan guruhlarga yuborish; {gid: natija} qaytaradi, akkaunt avtorizatsiyasiz bo'lsa None.
+    # Yuborishda akkaunt xatosi kelsa qolgan guruhlar to'xtatiladi, klient uziladi va None qaytariladi
+    async def broadcast(self, session_file, user_id, phone, group_ids, message_text, media_file_id, message_id=None):
+        async with self.clients.use(session_file) as client:
+            if client is None:
+                return None
+            tasks = [
+                self._deliver_logged(client, session_file, user_id, phone, gid, message_text, media_file_id, message_id)
+                for gid in group_ids
+            ]
+            results = await asyncio.gather(*tasks)
+        if session_file in self._revoked:
+            self._revoked.discard(session_file)
+            await self.clients.discard(session_file)
+            return None
+        deferred = sum(1 for result in results if result == DEFERRED)
+        if deferred:
+            logger.warning(f"{phone} akkaunti FloodWait sababli to'xtatildi, {deferred} ta guruh keyingi safar yuboriladi")
+        return dict(zip(group_ids, results))
+
+    # DELIVER_SECONDS - limit va navbat kutishlari bilan umumiy vaqt; jurnalga (latency_ms) esa
+    # faqat Telegram ga yuborish bosqichi yoziladi (yuborilmagan guruhlar uchun 0)
+    async def _deliver_logged(self, client, session_file, user_id, phone, gid, message_text, media_file_id, message_id):
+        started = time.monotonic()
+        status, error, send_seconds = await self._deliver(client, session_file, user_id, phone, gid, message_text, media_file_id, message_id)
+        DELIVER_SECONDS.observe(time.monotonic() - started, status=status)
+        if self.delivery_log is not None:
+            await self.delivery_log.record(message_id, gid, session_file, status, send_seconds * 1000, error)
+        return status
+
+    # (natija, xato, yuborish bosqichi davomiyligi) qaytaradi
+    async def _deliver(self, client, session_file, user_id, phone, gid, message_text, media_file_id, message_id=None):
+        attempt = 0
+        while True:
+            try:
+                send_seconds = await self._send_once(client, session_file, gid, message_text, media_file_id)
+                self.limiter.on_success(session_file)
+                logger.info(f"Xabar {gid} kanaliga {phone} orqali yuborildi")
+                return SENT, None, send_seconds
+            except AccountDeferred:
+                return DEFERRED, "paused", 0.0
+            except ACCOUNT_ERRORS as e:
+                logger.error(f"{phone} akkaunti avtorizatsiyadan chiqqan: {e}")
+                self._revoked.add(session_file)
+                return DEFERRED, e, 0.0
+            except FloodWaitError as e:
+                logger.warning(f"{phone} uchun FloodWait: {e.seconds} s")
+                FLOOD_WAITS.inc()
+                self.limiter.on_flood_wait(session_file, e.seconds)
+                if e.seconds > self.max_flood_sleep:
+                    return DEFERRED, e, 0.0
+            except SlowModeWaitError as e:
+                logger.warning(f"Kanal {gid} da slow mode: {e.seconds} s")
+                self.limiter.on_peer_wait(session_file, gid, e.seconds)
+                return DEFERRED, e, 0.0
+            except PEER_ERRORS as e:
+                logger.error(f"Kanal {gid} uchun xato: {e}")
+                if self.entity_cache is not None:
+                    await self.entity_cache.invalidate(session_file, gid)
+                await self._report(user_id, message_id, gid, e)
+                return FAILED, e, 0.0
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error(f"Kanal {gid} ga {attempt} urinishdan keyin yuborilmadi: {e}")
+                    await self._report(user_id, message_id, gid, e)
+                    return FAILED, e, 0.0
+                delay = self.retry_base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.warning(f"Kanal {gid} ga yuborishda vaqtinchalik xato: {e}, {delay:.1f} s dan keyin qayta urinish")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                logger.error(f"Kanal {gid} ga yuborishda xato: {e}")
+                await self._report(user_id, message_id, gid, e)
+                return FAILED, e, 0.0
+
+    # Yuborish bosqichining (limitlardan keyin) davomiyligini qaytaradi
+    async def _send_once(self, client, session_file, gid, message_text, media_file_id):
+        # Akkaunt uzoq pauzada bo'lsa navbatdagi guruhlar kutmasdan keyingi siklga qoldiriladi
+        if self.limiter.paused_for(session_file) > self.max_flood_sleep or session_file in self._revoked:
+            raise AccountDeferred()
+        # Entity aniqlash yuborishlardan alohida cheklanadi: keyingi guruhlar oldindan tayyorlanadi
+        with STAGE_SECONDS.time(stage="resolve"):
+            async with self._resolve_semaphore(session_file):
+                if self.entity_cache is not None:
+                    entity = await self.entity_cache.resolve(client, session_file, gid)
+                else:
+                    entity = await client.get_input_entity(gid)
+        with STAGE_SECONDS.time(stage="rate_limit"):
+            await self.limiter.acquire(session_file, gid)
+            if self.warmup is not None:
+                await self.warmup.acquire_send()
+        async with self._account_semaphore(session_file), self._global:
+            started = time.monotonic()
+            try:
+                if media_file_id:
+                    await self.media_cache.send_photo(client, session_file, entity, media_file_id, message_text)
+                else:
+                    await client.send_message(entity, message_text)
+            finally:
+                send_seconds = time.monotonic() - started
+                STAGE_SECONDS.observe(send_seconds, stage="send")
+        return send_seconds
+
+    async def _report(self, user_id, message_id, gid, error):
+        if self.on_error is None:
+            return
+        try:
+            await self.on_error(user_id, message_id, gid, error)
+        except Exception as e:
+            logger.error(f"Xato haqida xabar berishda xato: {e}")
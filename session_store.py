@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from telethon import utils
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+from telethon.tl.types import PeerChannel, PeerChat, PeerUser
+
+logger = logging.getLogger(__name__)
+
+
+# Telethon sessiyasi: auth key va DC ma'lumotlari har bir akkaunt uchun alohida .session fayl o'rniga
+# umumiy omborda (MySQL jadvali yoki bitta SQLite fayl) saqlanadi. Entity lar xotirada qoladi,
+# doimiy kesh uchun EntityCache (peer_cache) ishlatiladi - .session fayllardagi entity lar migratsiyada
+# peer_cache ga ko'chiriladi. Telethon save()/delete() ni await qiladi.
+class StoredSession(MemorySession):
+    def __init__(self, store, key, row=None):
+        super().__init__()
+        self.store = store
+        self.key = key
+        if row is not None:
+            dc_id, server_address, port, auth_key, takeout_id = row
+            self.set_dc(dc_id, server_address, port)
+            self._auth_key = AuthKey(auth_key) if auth_key else None
+            self._takeout_id = takeout_id
+
+    def row(self):
+        auth_key = self._auth_key.key if self._auth_key else None
+        return self._dc_id, self._server_address, self._port, auth_key, self._takeout_id
+
+    async def save(self):
+        await self.store.save(self.key, self.row())
+
+    async def delete(self):
+        await self.store.delete(self.key)
+
+
+class _SessionStore:
+    async def open(self, key):
+        return StoredSession(self, key, await self.load(key))
+
+
+# MySQL dagi tg_sessions jadvali
+class SqlSessionStore(_SessionStore):
+    def __init__(self, db):
+        self.db = db
+
+    async def load(self, key):
+        return await self.db.get_tg_session(key)
+
+    async def save(self, key, row):
+        await self.db.save_tg_sessions([(key,) + tuple(row) + (int(time.time()),)])
+
+    async def save_many(self, rows):
+        now = int(time.time())
+        await self.db.save_tg_sessions([(key,) + tuple(row) + (now,) for key, row in rows])
+
+    async def delete(self, key):
+        await self.db.delete_tg_session(key)
+
+    async def close(self):
+        pass
+
+
+# Bitta SQLite fayl (sessiya kaliti bo'yicha PRIMARY KEY); so'rovlar alohida thread da bajariladi
+class SqliteSessionStore(_SessionStore):
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS tg_sessions (
+                session_key TEXT PRIMARY KEY,
+                dc_id INTEGER,
+                server_address TEXT,
+                port INTEGER,
+                auth_key BLOB,
+                takeout_id INTEGER,
+                updated_at INTEGER)''')
+        return self._conn
+
+    def _run(self, query, args=(), many=False):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                if many:
+                    conn.executemany(query, args)
+                    return None
+                return conn.execute(query, args).fetchone()
+
+    async def load(self, key):
+        return await asyncio.to_thread(self._run, "SELECT dc_id, server_address, port, auth_key, takeout_id FROM tg_sessions WHERE session_key = ?", (key,))
+
+    async def save(self, key, row):
+        await self.save_many([(key, row)])
+
+    async def save_many(self, rows):
+        now = int(time.time())
+        await asyncio.to_thread(self._run, "INSERT OR REPLACE INTO tg_sessions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                [(key,) + tuple(row) + (now,) for key, row in rows], True)
+
+    async def delete(self, key):
+        await asyncio.to_thread(self._run, "DELETE FROM tg_sessions WHERE session_key = ?", (key,))
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Telethon ning .session faylidan (SQLite) auth key ni o'qish
+def read_session_file(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT dc_id, server_address, port, auth_key, takeout_id FROM sessions").fetchone()
+    finally:
+        conn.close()
+
+
+_PEER_TYPES = {PeerChannel: "channel", PeerChat: "chat", PeerUser: "user"}
+
+
+# .session faylidagi entity lar (peer_id, peer_type, entity_id, access_hash) ko'rinishida
+def read_session_entities(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT id, hash FROM entities").fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+    peers = []
+    for peer_id, access_hash in rows:
+        entity_id, peer_class = utils.resolve_id(peer_id)
+        peers.append((peer_id, _PEER_TYPES[peer_class], entity_id, access_hash or 0))
+    return peers
+
+
+# sessions/ katalogidagi fayllarni omborga ko'chirish; kalit - fayl yo'li (ClientManager dagi kabi).
+# db berilsa fayllardagi entity lar shu kalit bilan peer_cache ga yoziladi: yangi omborda ular
+# faqat xotirada bo'ladi va avval yaratilgan xabarlarning guruhlari aks holda aniqlanmay qoladi
+async def migrate_directory(store, directory="sessions", batch_size=500, db=None):
+    migrated = 0
+    failed = 0
+    peers = 0
+    batch = []
+    peer_rows = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.session"))):
+        try:
+            row = read_session_file(path)
+        except sqlite3.Error as e:
+            logger.error(f"{path} ni o'qishda xato: {e}")
+            failed += 1
+            continue
+        if row is None or not row[3]:
+            logger.warning(f"{path} da auth key yo'q, o'tkazib yuborildi")
+            failed += 1
+            continue
+        batch.append((path, row))
+        if db is not None:
+            now = int(time.time())
+            peer_rows.extend((path,) + peer + (now,) for peer in read_session_entities(path))
+        if len(batch) >= batch_size:
+            await store.save_many(batch)
+            migrated += len(batch)
+            batch = []
+        if len(peer_rows) >= batch_size:
+            await db.save_cached_peers(peer_rows)
+            peers += len(peer_rows)
+            peer_rows = []
+    if batch:
+        await store.save_many(batch)
+        migrated += len(batch)
+    if peer_rows:
+        await db.save_cached_peers(peer_rows)
+        peers += len(peer_rows)
+    return migrated, failed, peers
+
+
+# python -m session_store --backend mysql   (MYSQL_* muhit o'zgaruvchilari bilan)
+# python -m session_store --backend sqlite --sqlite-path sessions/sessions.db
+# Ikkala holatda ham entity lar MySQL dagi peer_cache ga yoziladi (EntityCache shu jadvalni o'qiydi)
+async def _migrate(args):
+    from db import Database
+    db = Database(os.getenv("MYSQL_HOST"), os.getenv("MYSQL_USER"), os.getenv("MYSQL_PASSWORD"), os.getenv("MYSQL_DB"))
+    await db.connect()
+    await db.init_schema()
+    if args.backend == "mysql":
+        store = SqlSessionStore(db)
+    else:
+        store = SqliteSessionStore(args.sqlite_path)
+    try:
+        migrated, failed, peers = await migrate_directory(store, args.directory, db=db)
+        print(f"Ko'chirildi: {migrated}, o'tkazib yuborildi: {failed}, entity lar: {peers}")
+    finally:
+        await store.close()
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sessions/ katalogidagi .session fayllarni umumiy omborga ko'chirish")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], required=True)
+    parser.add_argument("--directory", default="sessions")
+    parser.add_argument("--sqlite-path", default="sessions/sessions.db")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_migrate(parser.parse_args()))
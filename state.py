@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+# Suhbat holatlari (FSM) uchun xotiradagi ombor: LRU + TTL bilan chegaralangan
+class MemoryStateStore:
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._states = OrderedDict()
+
+    async def get(self, user_id):
+        cached = self._states.get(user_id)
+        if cached is None:
+            return None
+        state, updated = cached
+        if time.monotonic() - updated > self.ttl:
+            del self._states[user_id]
+            return None
+        return dict(state)
+
+    async def set(self, user_id, state):
+        self._states[user_id] = (dict(state), time.monotonic())
+        self._states.move_to_end(user_id)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+
+    async def delete(self, user_id):
+        self._states.pop(user_id, None)
+
+    async def cleanup(self):
+        now = time.monotonic()
+        while self._states:
+            user_id, (_, updated) = next(iter(self._states.items()))
+            if now - updated <= self.ttl:
+                break
+            del self._states[user_id]
+
+
+# MySQL dagi user_states jadvalida saqlanadigan ombor: qayta ishga tushganda holatlar yo'qolmaydi.
+# Holat JSON ga aylantiriladigan bo'lishi kerak.
+class SqlStateStore:
+    def __init__(self, db, ttl=24 * 3600):
+        self.db = db
+        self.ttl = ttl
+
+    async def get(self, user_id):
+        raw = await self.db.get_user_state(user_id, int(time.time() - self.ttl))
+        return json.loads(raw) if raw else None
+
+    async def set(self, user_id, state):
+        await self.db.set_user_state(user_id, json.dumps(state), int(time.time()))
+
+    async def delete(self, user_id):
+        await self.db.delete_user_state(user_id)
+
+    async def cleanup(self):
+        await self.db.delete_user_states_before(int(time.time() - self.ttl))
+
+
+async def run_state_cleanup(store, interval=300):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.cleanup()
+        except Exception as e:
+            logger.error(f"Holatlarni tozalashda xato: {e}")
+
+
+# Katta yoki saqlab bo'lmaydigan obyektlar (masalan, login jarayonidagi TelegramClient) uchun
+# muddati o'tganda uziladigan registr
+class ClientRegistry:
+    def __init__(self, ttl=600, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clients = OrderedDict()
+
+    async def put(self, key, client):
+        old = self._clients.pop(key, None)
+        if old is not None and old[0] is not client:
+            await self._disconnect(key, old[0])
+        self._clients[key] = (client, time.monotonic())
+        while len(self._clients) > self.max_entries:
+            old_key, (old_client, _) = self._clients.popitem(last=False)
+            await self._disconnect(old_key, old_client)
+
+    def get(self, key):
+        cached = self._clients.get(key)
+        return cached[0] if cached is not None else None
+
+    # Klientni registrdan olib chiqadi (uzmasdan), masalan ClientManager ga topshirish uchun
+    def pop(self, key):
+        cached = self._clients.pop(key, None)
+        return cached[0] if cached is not None else None
+
+    async def discard(self, key):
+        client = self.pop(key)
+        if client is not None:
+            await self._disconnect(key, client)
+
+    async def _disconnect(self, key, client):
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.error(f"Login klientini uzishda xato ({key}): {e}")
+
+    async def close_expired(self):
+        now = time.monotonic()
+        while self._clients:
+            key, (client, created) = next(iter(self._clients.items()))
+            if now - created <= self.ttl:
+                break
+            del self._clients[key]
+            await self._disconnect(key, client)
+            logger.info(f"Tugallanmagan login klienti yopildi: {key}")
+
+    async def run_janitor(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            await self.close_expired()
+
+    async def close_all(self):
+        while self._clients:
+            key, (client, _) = self._clients.popitem(last=False)
+            await self._disconnect(key, client)
+
+    def __len__(self):
+        return len(self._clients)
+
+
+# Kalit bo'yicha locklar: hech kim ushlamagan lock lug'atdan o'chiriladi, shuning uchun cheksiz o'smaydi
+class LockRegistry:
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
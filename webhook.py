@@ -0,0 +1,76 @@
+import asyncio
+import hmac
+import logging
+from aiohttp import web
+from telebot.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+# Webhook rejimi: Telegram yangilanishlarni POST qiladi, ular navbatga qo'yiladi va
+# cheklangan sonli worker lar tomonidan parallel qayta ishlanadi.
+# Mahalliy sinash uchun yozib olingan update JSON ni shu manzilga POST qilish kifoya.
+class WebhookServer:
+    def __init__(self, bot, secret_token, host="127.0.0.1", port=8080, path="/webhook", workers=32, max_queue=1000):
+        self.bot = bot
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        self._runner = None
+
+    async def handle(self, request):
+        token = request.headers.get(SECRET_HEADER, "")
+        # bytes sifatida solishtiriladi: str dagi ASCII bo'lmagan belgilar TypeError beradi
+        if not hmac.compare_digest(token.encode("utf-8", "surrogateescape"), self.secret_token.encode()):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json())
+        except Exception as e:
+            logger.error(f"Noto'g'ri update: {e}")
+            return web.Response(status=400)
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram 5xx javobdan keyin update ni qayta yuboradi
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f"Update {update.update_id} ni qayta ishlashda xato: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(f"Webhook http://{self.host}:{self.port}{self.path} da tinglanmoqda")
+
+    # Yangi so'rovlar qabul qilinmaydi, navbatdagilar tugatiladi, keyin worker lar to'xtaydi
+    async def stop(self, timeout=30):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Webhook navbati {timeout} s ichida tugatilmadi")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
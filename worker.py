@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import math
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Bir nechta yuboruvchi jarayonni baza orqali muvofiqlashtirish.
+# Har bir worker akkauntlarning bir qismini (shard) account_leases jadvalidagi ijara orqali oladi,
+# ijarani heartbeat bilan yangilab turadi; worker o'lsa ijara muddati tugaydi va boshqasi oladi.
+# Bot jarayoni faqat messages va message_events jadvallariga yozadi, worker lar
+# message_events ni kursor bo'yicha o'qib, yangi/bekor qilingan xabarlarni bilib oladi.
+class ShardCoordinator:
+    def __init__(self, db, owner, on_acquire, on_release, on_event, lease_ttl=30, heartbeat=10,
+                 poll_interval=1.0, event_retention=24 * 3600):
+        self.db = db
+        self.owner = owner
+        # on_acquire(session_file), on_release(session_file), on_event(message_id, event) - korutinalar
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self.on_event = on_event
+        self.lease_ttl = lease_ttl
+        self.heartbeat = heartbeat
+        self.poll_interval = poll_interval
+        self.event_retention = event_retention
+        self.owned = set()
+        self._valid_until = 0.0
+        self._cursor = 0
+        self._tasks = []
+
+    # Ijara hali amal qiladimi (heartbeat kechiksa yuborish to'xtatiladi)
+    def owns(self, session_file):
+        return session_file in self.owned and time.time() < self._valid_until
+
+    async def _acquire(self, session_file):
+        self.owned.add(session_file)
+        try:
+            await self.on_acquire(session_file)
+        except Exception as e:
+            logger.error(f"Akkaunt {session_file} ni yuklashda xato: {e}")
+
+    async def _release(self, session_file, delete_lease=True):
+        self.owned.discard(session_file)
+        try:
+            await self.on_release(session_file)
+        except Exception as e:
+            logger.error(f"Akkaunt {session_file} ni bo'shatishda xato: {e}")
+        if delete_lease:
+            await self.db.release_lease(session_file, self.owner)
+
+    async def rebalance(self):
+        now = int(time.time())
+        expires_at = now + self.lease_ttl
+        await self.db.register_worker(self.owner, now)
+
+        # O'zimizdagi ijaralarni yangilash; boshqa worker olib qo'yganlari bo'shatiladi
+        renewed = set(await self.db.renew_leases(self.owner, expires_at, now))
+        self._valid_until = expires_at
+        for session_file in self.owned - renewed:
+            logger.warning(f"Akkaunt {session_file} ijarasi yo'qoldi")
+            await self._release(session_file, delete_lease=False)
+
+        accounts = await self.db.get_sender_accounts()
+        active = set(accounts)
+        for session_file in self.owned - active:
+            await self._release(session_file)
+
+        workers = await self.db.count_live_workers(now - self.lease_ttl)
+        fair_share = max(1, math.ceil(len(accounts) / max(1, workers)))
+
+        # Ortiqcha akkauntlar boshqa worker lar uchun bo'shatiladi
+        for session_file in list(self.owned)[fair_share:]:
+            await self._release(session_file)
+
+        candidates = [session_file for session_file in accounts if session_file not in self.owned]
+        random.shuffle(candidates)
+        for session_file in candidates:
+            if len(self.owned) >= fair_share:
+                break
+            if await self.db.claim_lease(session_file, self.owner, expires_at, now):
+                logger.info(f"Akkaunt {session_file} olindi")
+                await self._acquire(session_file)
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await self.rebalance()
+                await self.db.delete_message_events_before(int(time.time() - self.event_retention))
+            except Exception as e:
+                logger.error(f"Heartbeat xatosi: {e}")
+            await asyncio.sleep(self.heartbeat)
+
+    async def _event_loop(self):
+        while True:
+            try:
+                events = await self.db.get_message_events(self._cursor, 500)
+                for event_id, message_id, event in events:
+                    self._cursor = event_id
+                    await self.on_event(message_id, event)
+                if len(events) == 500:
+                    continue
+            except Exception as e:
+                logger.error(f"Hodisalarni o'qishda xato: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self):
+        # Boshlang'ich holat akkauntlarni olishda to'liq yuklanadi, shuning uchun eski hodisalar o'tkazib yuboriladi
+        self._cursor = await self.db.get_last_message_event_id()
+        await self.rebalance()
+        self._tasks = [
+            asyncio.create_task(self._heartbeat_loop()),
+            asyncio.create_task(self._event_loop()),
+        ]
+
+    # To'xtashda ijaralar darhol bo'shatiladi, boshqa worker lar kutmasdan oladi
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for session_file in list(self.owned):
+            await self._release(session_file)
+        await self.db.unregister_worker(self.owner)